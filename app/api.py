@@ -1,28 +1,90 @@
 import logging
+import json
+import os
 import uuid
 import asyncio
 from datetime import datetime
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Tuple
 
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from core.base import AdvancedWorkflowOrchestrator
+from core import artifacts
+from core.config import (
+    STATE_TASK_TTL_SECONDS, ARTIFACT_MODE, REQUEST_TIMEOUT_SECONDS, DISCONNECT_POLL_SECONDS,
+    BATCH_MAX_TASKS, BATCH_CONCURRENCY,
+)
+from core.deadline import request_deadline
+from core.state import TASKS, get_state_store
+from utils.profiling import load_profile_summary, profile_dir_for, should_profile
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def _record_task(task_id: str, **fields):
+    """Stores a task's status in the shared state store, so every worker can report it."""
+    try:
+        store = get_state_store()
+        task = await store.aget(TASKS, task_id) or {"task_id": task_id}
+        task.update(fields, updated_at=datetime.now().isoformat())
+        await store.aset(TASKS, task_id, task, ttl=STATE_TASK_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not record status of task {task_id}: {e}")
+
+def _detect_workflow_type(task_description: str) -> str:
+    """Decides which workflow to use based on the content of the request."""
+    lowered = task_description.lower()
+    if "duckdb" in lowered or "sql" in lowered or "s3://" in lowered:
+        return "database_analysis"
+    return "multi_step_web_scraping"
+
+class ClientDisconnected(Exception):
+    """The client went away before its request finished; its work was cancelled."""
+
+async def _run_while_connected(request: Request, work: Awaitable[Any], timeout: float) -> Any:
+    """
+    Awaits `work`, cancelling it on timeout or as soon as the client disconnects.
+    Cancellation reaches every stage: fetches, LLM calls and sandbox process groups are stopped.
+    """
+    task = asyncio.ensure_future(work)
+    disconnected = False
+
+    async def watch_disconnect():
+        nonlocal disconnected
+        while not task.done():
+            if await request.is_disconnected():
+                disconnected = True
+                task.cancel()
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        return await asyncio.wait_for(task, timeout=timeout)
+    except asyncio.CancelledError:
+        if disconnected:
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
+
 try:
     orchestrator = AdvancedWorkflowOrchestrator()
     logger.info("✅ AdvancedWorkflowOrchestrator initialized successfully.")
-    logger.info(f"   Available workflows: {list(orchestrator.workflows.keys())}")
+    logger.info(f"   Registered workflows (loaded lazily): {orchestrator.available_workflows}")
 except Exception as e:
     logger.error(f"❌ CRITICAL: Failed to initialize AdvancedWorkflowOrchestrator: {e}")
     orchestrator = None
 
 @router.post("/")
 async def analyze_data(
+    request: Request,
     questions_txt: UploadFile = File(..., description="A .txt file with the user's questions."),
     files: List[UploadFile] = File([], description="Optional additional files (e.g., CSV, images)."),
+    profile: bool = Form(False, description="Profile the generated code (CPU and memory)."),
+    inline_artifacts: bool = Form(ARTIFACT_MODE == "inline",
+                                  description="Embed charts as base64 data URIs instead of /api/artifacts references."),
 ):
     """
     Main API endpoint to process data analysis tasks. It intelligently routes
@@ -44,37 +106,215 @@ async def analyze_data(
         logger.info("   - questions.txt processed successfully.")
 
         # --- Intelligent Workflow Detection ---
-        # Decide which workflow to use based on the content of the request.
-        if "duckdb" in task_description.lower() or "sql" in task_description.lower() or "s3://" in task_description.lower():
-            workflow_type = "database_analysis"
-        else:
-            workflow_type = "multi_step_web_scraping"
-        
+        workflow_type = _detect_workflow_type(task_description)
         logger.info(f"   - Detected workflow type: {workflow_type}")
+        await _record_task(task_id, status="running", workflow_type=workflow_type, started_at=datetime.now().isoformat())
 
+        profiling = should_profile(profile)
         workflow_input = {
             "task_description": task_description,
+            "profile_dir": profile_dir_for(task_id) if profiling else None,
             # Pass other necessary data here if needed by workflows
         }
 
-        # Execute the selected workflow with a 3-minute timeout
-        result = await asyncio.wait_for(
-            orchestrator.execute_workflow(workflow_type, workflow_input),
-            timeout=300
-        )
+        # Execute the selected workflow within the request deadline; every stage sizes its
+        # own timeouts to what is left of it. Profiled runs bypass the shared result cache
+        # so the code really executes.
+        with request_deadline(REQUEST_TIMEOUT_SECONDS):
+            result = await _run_while_connected(
+                request,
+                orchestrator.execute_workflow(workflow_type, workflow_input, use_cache=not profiling),
+                timeout=REQUEST_TIMEOUT_SECONDS,
+            )
 
         logger.info(f"✅ Task {task_id} completed successfully.")
-        return {
+        await _record_task(task_id, status="completed", result=result)
+        if inline_artifacts:
+            result = await asyncio.to_thread(artifacts.inline_artifacts, result)
+        response = {
             "task_id": task_id,
             "status": "completed",
             "workflow_type": workflow_type,
             "result": result,
             "timestamp": datetime.now().isoformat(),
         }
+        if profiling:
+            response["profile_url"] = f"/api/profiles/{task_id}"
+        return response
 
-    except asyncio.TimeoutError:
-        logger.error(f"❌ Task {task_id} timed out after 3 minutes.")
-        raise HTTPException(status_code=408, detail="Request timed out after 3 minutes.")
+    except asyncio.TimeoutError as e:
+        logger.error(f"❌ Task {task_id} timed out after {REQUEST_TIMEOUT_SECONDS:.0f}s: {e}")
+        await _record_task(task_id, status="failed", error="timeout")
+        raise HTTPException(status_code=408, detail=f"Request timed out after {REQUEST_TIMEOUT_SECONDS:.0f} seconds.")
+    except ClientDisconnected:
+        logger.warning(f"🔌 Task {task_id} cancelled: the client disconnected.")
+        await _record_task(task_id, status="cancelled", error="client disconnected")
+        # Nobody is listening; 499 (client closed request) only shows up in access logs and metrics.
+        raise HTTPException(status_code=499, detail="Client disconnected.")
     except Exception as e:
         logger.error(f"❌ Task {task_id} failed: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        await _record_task(task_id, status="failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@router.post("/batch")
+async def analyze_batch(
+    questions: List[UploadFile] = File(..., description="One questions .txt file per task."),
+    inline_artifacts: bool = Form(ARTIFACT_MODE == "inline",
+                                  description="Embed charts as base64 data URIs instead of /api/artifacts references."),
+):
+    """
+    Runs many tasks in one request and streams their results as NDJSON: a header line
+    mapping every task's index and filename to its task_id, then one line per task in
+    completion order, then a summary line. Identical questions run once,
+    tasks on the same pages or files share one load, at most BATCH_CONCURRENCY tasks run
+    at a time, and each task gets its own REQUEST_TIMEOUT_SECONDS deadline. Every task is
+    also recorded under its task_id for `GET /api/tasks/{task_id}` from the moment the
+    batch is accepted (as "queued"); tasks left unfinished when the client disconnects
+    are recorded as "cancelled".
+    """
+    if orchestrator is None:
+        raise HTTPException(
+            status_code=500,
+            detail="Server is not configured correctly. Orchestrator could not be initialized."
+        )
+    if len(questions) > BATCH_MAX_TASKS:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {BATCH_MAX_TASKS} tasks.")
+
+    batch_id = str(uuid.uuid4())
+    # Identical questions (same workflow and text) are executed once and answered for every copy.
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for index, upload in enumerate(questions):
+        try:
+            task_description = (await upload.read()).decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail=f"Task {index} ({upload.filename}) is not UTF-8 text.")
+        workflow_type = _detect_workflow_type(task_description)
+        groups.setdefault((workflow_type, task_description), []).append(
+            {"index": index, "task_id": str(uuid.uuid4()), "filename": upload.filename, "workflow_type": workflow_type}
+        )
+    accepted = sorted((member for members in groups.values() for member in members), key=lambda m: m["index"])
+    queued_at = datetime.now().isoformat()
+    for member in accepted:
+        await _record_task(member["task_id"], status="queued", workflow_type=member["workflow_type"],
+                           batch_id=batch_id, index=member["index"], filename=member["filename"],
+                           queued_at=queued_at)
+    logger.info(f"📦 Starting batch {batch_id}: {len(questions)} tasks, {len(groups)} distinct.")
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_group(workflow_type: str, task_description: str, members: List[Dict[str, Any]]) -> Any:
+        try:
+            async with semaphore:
+                started_at = datetime.now().isoformat()
+                for member in members:
+                    await _record_task(member["task_id"], status="running", workflow_type=workflow_type,
+                                       batch_id=batch_id, started_at=started_at)
+                with request_deadline(REQUEST_TIMEOUT_SECONDS):
+                    return await asyncio.wait_for(
+                        orchestrator.execute_workflow(
+                            workflow_type, {"task_description": task_description, "profile_dir": None}, use_cache=True
+                        ),
+                        timeout=REQUEST_TIMEOUT_SECONDS,
+                    )
+        except asyncio.CancelledError:
+            # The stream was closed before this group finished (the client went away).
+            for member in members:
+                await _record_task(member["task_id"], status="cancelled", error="client disconnected")
+            raise
+
+    async def stream_results() -> AsyncIterator[str]:
+        pending = {
+            asyncio.create_task(run_group(workflow_type, task_description, members)): members
+            for (workflow_type, task_description), members in groups.items()
+        }
+        failed = 0
+        try:
+            yield json.dumps({
+                "batch_id": batch_id, "status": "accepted", "tasks": accepted, "distinct_tasks": len(groups),
+            }) + "\n"
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    members = pending.pop(finished)
+                    try:
+                        result, error = finished.result(), None
+                    except asyncio.TimeoutError:
+                        result, error = None, f"Task timed out after {REQUEST_TIMEOUT_SECONDS:.0f} seconds."
+                    except Exception as e:
+                        logger.error(f"❌ Batch {batch_id} task failed: {e}", exc_info=True)
+                        result, error = None, str(e)
+                    returned = result
+                    if error is None and inline_artifacts:
+                        returned = await asyncio.to_thread(artifacts.inline_artifacts, result)
+                    for member in members:
+                        if error is None:
+                            await _record_task(member["task_id"], status="completed", result=result)
+                            line = {**member, "status": "completed", "result": returned}
+                        else:
+                            failed += 1
+                            await _record_task(member["task_id"], status="failed", error=error)
+                            line = {**member, "status": "failed", "error": error}
+                        yield json.dumps({**line, "timestamp": datetime.now().isoformat()}, default=str) + "\n"
+        finally:
+            # The client went away (or the server is stopping): cancel everything still running.
+            for task in pending:
+                task.cancel()
+        logger.info(f"✅ Batch {batch_id} finished: {len(questions) - failed} completed, {failed} failed.")
+        yield json.dumps({
+            "batch_id": batch_id, "status": "finished", "tasks": len(questions),
+            "distinct_tasks": len(groups), "failed": failed,
+        }) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
+@router.get("/profiles/{task_id}")
+async def get_profile(task_id: str):
+    """
+    Returns the CPU hot spots, peak memory and top allocations recorded for a profiled task.
+    The raw cProfile dumps are stored next to the summary in PROFILE_ARTIFACT_DIR.
+    """
+    try:
+        summary = await asyncio.to_thread(load_profile_summary, task_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid task id.")
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile recorded for task {task_id}.")
+    return {"task_id": task_id, **summary}
+
+@router.get("/tasks/{task_id}")
+async def get_task(task_id: str):
+    """
+    Returns the status (running, completed, failed or cancelled) and, once completed, the result of a task.
+    Tasks are kept in the shared state store, so any worker process can answer.
+    """
+    task = await get_state_store().aget(TASKS, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found.")
+    return task
+
+@router.get("/artifacts/{artifact_id}")
+async def get_artifact(artifact_id: str, request: Request):
+    """
+    Serves a chart or table referenced from a task result. Artifacts are
+    content-addressed and never change, so they are cacheable forever and
+    revalidation by ETag costs a 304. Generated SVGs can carry scripts, so every
+    artifact is served with a sandboxing CSP and SVGs as attachments.
+    """
+    path = artifacts.artifact_path(artifact_id)
+    if path is None:
+        raise HTTPException(status_code=400, detail="Invalid artifact id.")
+    # Check before revalidating: a swept artifact must not answer 304 to a cached client.
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Artifact {artifact_id} not found.")
+    etag = f'"{artifact_id.split(".")[0]}"'
+    headers = {
+        "ETag": etag, "Cache-Control": "public, max-age=31536000, immutable",
+        "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        "X-Content-Type-Options": "nosniff",
+    }
+    media_type = artifacts.media_type_for(artifact_id)
+    if media_type == "image/svg+xml":
+        headers["Content-Disposition"] = f'attachment; filename="{artifact_id}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
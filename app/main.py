@@ -1,7 +1,22 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import logging
+import sys
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api import router as api_router
-from core.config import API_TITLE, API_VERSION, API_DESCRIPTION
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from app.api import router as api_router, orchestrator
+from core.metrics import PROMETHEUS_AVAILABLE, observe_http_request, observe_payload, render_metrics
+from core.artifacts import sweep_artifacts
+from utils.profiling import sweep_profiles
+from core.config import (
+    API_TITLE, API_VERSION, API_DESCRIPTION, WARM_UP_ON_STARTUP, BROWSER_FALLBACK_ENABLED,
+    ARTIFACT_SWEEP_INTERVAL_SECONDS,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -11,16 +26,99 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+APP_IMPORT_SECONDS = round(time.perf_counter() - _IMPORT_STARTED, 4)
+logger.info(f"⏱️ Application modules imported in {APP_IMPORT_SECONDS:.2f}s")
+
+async def sweep_artifacts_periodically():
+    """Applies the artifact and profile retention limits every ARTIFACT_SWEEP_INTERVAL_SECONDS."""
+    while True:
+        for sweep in (sweep_artifacts, sweep_profiles):
+            try:
+                await asyncio.to_thread(sweep)
+            except Exception as e:
+                logger.warning(f"⚠️ {sweep.__name__} failed: {e}")
+        await asyncio.sleep(ARTIFACT_SWEEP_INTERVAL_SECONDS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background workflow warm-up (and the headless-browser pool) once the
+    server is accepting connections, and the artifact sweep. Stops them and shuts
+    the browser down on exit.
+    """
+    warm_up_task = None
+    if orchestrator is not None and WARM_UP_ON_STARTUP:
+        warm_up_task = asyncio.create_task(orchestrator.warm_up())
+        if BROWSER_FALLBACK_ENABLED:
+            # Imported only here: playwright is heavy and unused while the fallback is disabled.
+            from utils.browser_pool import get_browser_pool
+            asyncio.create_task(get_browser_pool())
+    sweep_task = asyncio.create_task(sweep_artifacts_periodically()) if ARTIFACT_SWEEP_INTERVAL_SECONDS > 0 else None
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    if sweep_task is not None:
+        sweep_task.cancel()
+    # The pool module is loaded by the warm-up above or by the first scrape, if at all.
+    browser_pool = sys.modules.get("utils.browser_pool")
+    if browser_pool is not None:
+        await browser_pool.close_browser_pool()
+
 # Initialize the FastAPI app
 app = FastAPI(
     title=API_TITLE,
     description=API_DESCRIPTION,
     version=API_VERSION,
+    lifespan=lifespan,
 )
 
+# Compress large JSON responses (results with tables, metrics) for clients that accept gzip.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Include the API router
 app.include_router(api_router, prefix="/api")
 
+class RequestMetricsMiddleware:
+    """
+    Records latency and payload sizes of every HTTP request.
+    Plain ASGI rather than `@app.middleware("http")`: BaseHTTPMiddleware hides the
+    client's `http.disconnect` from endpoints, which then cannot cancel abandoned work.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        response_bytes = 0
+
+        async def send_and_observe(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        finally:
+            # Label by endpoint name rather than raw path to keep label cardinality bounded.
+            # The router stores the matched route in the (shared) scope.
+            endpoint = getattr(scope.get("route"), "name", None) or "unmatched"
+            observe_http_request(scope["method"], endpoint, status_code, time.perf_counter() - started)
+            headers = dict(scope.get("headers") or [])
+            if headers.get(b"content-length"):
+                observe_payload("request", int(headers[b"content-length"]))
+            if response_bytes:
+                observe_payload("response", response_bytes)
+
+app.add_middleware(RequestMetricsMiddleware)
+
 @app.get("/")
 async def root():
     """
@@ -36,6 +134,36 @@ async def root():
 @app.get("/health")
 async def health_check():
     """
-    Health check endpoint.
+    Health check endpoint. Only reports that the process is alive.
+    """
+    return {"status": "ok"}
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage timings, LLM and sandbox durations, retries and payload sizes.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return PlainTextResponse("prometheus_client is not installed.", status_code=503)
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint. Returns 503 until every workflow has been loaded,
+    together with an import-time report for the application and each workflow.
+    With WARM_UP_ON_STARTUP=false nothing loads the workflows before the first
+    request, so the app reports ready at once and loads each workflow on first use.
     """
-    return {"status": "ok"}
\ No newline at end of file
+    if orchestrator is None:
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+
+    ready = orchestrator.is_ready or not WARM_UP_ON_STARTUP
+    content = {
+        "status": "ready" if ready else "warming_up",
+        "warm_up": "enabled" if WARM_UP_ON_STARTUP else "disabled",
+        "app_import_seconds": APP_IMPORT_SECONDS,
+        "workflows": orchestrator.import_report(),
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=content)
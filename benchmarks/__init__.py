@@ -0,0 +1,6 @@
+"""
+Offline benchmarks for the Data Analysis Platform.
+
+Nothing here talks to the network: the chat model is replaced by a replay
+model and web pages are served from local fixtures.
+"""
@@ -0,0 +1,214 @@
+"""
+Offline end-to-end load benchmark.
+
+Runs the FastAPI app in-process, replaces the shared chat model with a
+deterministic replay model and serves the scraped pages from local fixtures,
+then drives concurrent `POST /api/` load for each workflow and reports latency
+percentiles, throughput and per-stage time.
+
+Usage (from the repository root):
+
+    python -m benchmarks.e2e_load --requests 40 --concurrency 8
+    python -m benchmarks.e2e_load --save-baseline
+    python -m benchmarks.e2e_load --compare --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any, List
+
+import httpx
+
+# Measure the pipeline, not the result and frame caches: every request would be a cache hit otherwise.
+os.environ.setdefault("RESULT_CACHE_TTL_SECONDS", "0")
+os.environ.setdefault("STATE_STORE_URL", "memory://")
+os.environ.setdefault("FRAME_CACHE_ENABLED", "false")
+
+from benchmarks.local_site import serve_directory
+from benchmarks.replay_llm import FIXTURES_DIR, ReplayChatModel
+from core.config import set_shared_chat_model
+from core.timing import collect_stage_timings
+
+logger = logging.getLogger(__name__)
+
+QUESTIONS_DIR = os.path.join(FIXTURES_DIR, "questions")
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "e2e_load.json")
+
+WORKFLOW_QUESTIONS = {
+    "multi_step_web_scraping": "web_highest_grossing_films.txt",
+    "database_analysis": "db_high_court.txt",
+}
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; returns 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def load_questions(workflow: str, base_url: str) -> str:
+    with open(os.path.join(QUESTIONS_DIR, WORKFLOW_QUESTIONS[workflow]), encoding="utf-8") as f:
+        return f.read().replace("{base_url}", base_url)
+
+async def _send_request(client: httpx.AsyncClient, questions: str, workflow: str) -> Dict[str, Any]:
+    with collect_stage_timings() as timings:
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/", files={"questions_txt": ("questions.txt", questions, "text/plain")})
+            body = response.json()
+            result = body.get("result") if isinstance(body, dict) else None
+            ok = (response.status_code == 200 and body.get("status") == "completed"
+                  and body.get("workflow_type") == workflow
+                  and not (isinstance(result, dict) and "error" in result))
+            error = None if ok else f"HTTP {response.status_code}: {str(body)[:200]}"
+        except Exception as e:
+            ok, error = False, str(e)
+        elapsed = time.perf_counter() - started
+    return {"seconds": elapsed, "ok": ok, "error": error, "stages": list(timings)}
+
+async def run_workflow_load(client: httpx.AsyncClient, workflow: str, questions: str,
+                            total_requests: int, concurrency: int) -> Dict[str, Any]:
+    """Sends `total_requests` requests with at most `concurrency` in flight and summarises them."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            return await _send_request(client, questions, workflow)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded() for _ in range(total_requests)))
+    wall_seconds = time.perf_counter() - started
+    return summarize(results, wall_seconds, concurrency)
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float, concurrency: int) -> Dict[str, Any]:
+    latencies = [r["seconds"] for r in results if r["ok"]]
+    errors = [r["error"] for r in results if not r["ok"]]
+
+    per_stage: Dict[str, List[float]] = defaultdict(list)
+    for r in results:
+        totals: Dict[str, float] = defaultdict(float)
+        for stage, seconds in r["stages"]:
+            totals[stage] += seconds
+        for stage, seconds in totals.items():
+            per_stage[stage].append(seconds)
+
+    return {
+        "requests": len(results),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+        },
+        "stages_seconds": {
+            stage: {"mean": round(sum(v) / len(v), 4), "p95": round(percentile(v, 95), 4)}
+            for stage, v in sorted(per_stage.items())
+        },
+    }
+
+async def run_benchmark(workflows: List[str], total_requests: int, concurrency: int,
+                        warmup_requests: int, llm_latency: float, cold: bool,
+                        verbose: bool = False) -> Dict[str, Any]:
+    set_shared_chat_model(ReplayChatModel(latency_seconds=llm_latency))
+    # Imported after the chat model is swapped so no workflow ever sees the real client.
+    from app.main import app
+    from app.api import orchestrator
+    if not verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    if not cold:
+        await orchestrator.warm_up()
+
+    report: Dict[str, Any] = {"llm_latency_seconds": llm_latency, "workflows": {}}
+    with serve_directory() as base_url:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            for workflow in workflows:
+                questions = load_questions(workflow, base_url)
+                if warmup_requests:
+                    await run_workflow_load(client, workflow, questions, warmup_requests, concurrency)
+                report["workflows"][workflow] = await run_workflow_load(
+                    client, workflow, questions, total_requests, concurrency
+                )
+    return report
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Returns a description of every p95 latency or throughput regression beyond `threshold` (a fraction)."""
+    regressions = []
+    for workflow, current in report["workflows"].items():
+        previous = baseline.get("workflows", {}).get(workflow)
+        if not previous:
+            continue
+        old_p95, new_p95 = previous["latency_seconds"]["p95"], current["latency_seconds"]["p95"]
+        if old_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{workflow}: p95 latency {old_p95:.3f}s -> {new_p95:.3f}s")
+        old_rps, new_rps = previous["throughput_rps"], current["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - threshold):
+            regressions.append(f"{workflow}: throughput {old_rps:.2f} -> {new_rps:.2f} req/s")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{workflow}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+def print_report(report: Dict[str, Any]):
+    for workflow, summary in report["workflows"].items():
+        latency = summary["latency_seconds"]
+        print(f"\n== {workflow} ({summary['requests']} requests, concurrency {summary['concurrency']}) ==")
+        print(f"  throughput: {summary['throughput_rps']:.2f} req/s   errors: {summary['errors']}")
+        print(f"  latency:    p50 {latency['p50']:.3f}s   p95 {latency['p95']:.3f}s   p99 {latency['p99']:.3f}s")
+        for stage, stats in summary["stages_seconds"].items():
+            print(f"  {stage:<16} mean {stats['mean']:.3f}s   p95 {stats['p95']:.3f}s")
+        for error in summary["sample_errors"]:
+            print(f"  error: {error}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workflow", choices=sorted(WORKFLOW_QUESTIONS) + ["all"], default="all")
+    parser.add_argument("--requests", type=int, default=20, help="Measured requests per workflow.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests sent first per workflow.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM response time in seconds.")
+    parser.add_argument("--cold", action="store_true", help="Skip the workflow warm-up before measuring.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions against the baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (0.2 = 20%%).")
+    parser.add_argument("--output", help="Also write the JSON report to this path.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    workflows = sorted(WORKFLOW_QUESTIONS) if args.workflow == "all" else [args.workflow]
+    report = asyncio.run(run_benchmark(workflows, args.requests, args.concurrency,
+                                       args.warmup, args.llm_latency, args.cold, args.verbose))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+            return 1
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.threshold)
+        if regressions:
+            print("\nRegressions against baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
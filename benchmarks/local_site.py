@@ -0,0 +1,28 @@
+import functools
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+SITE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "site")
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        logger.debug("local site: " + format, *args)
+
+@contextmanager
+def serve_directory(directory: str = SITE_DIR, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """Serves `directory` over HTTP on a background thread and yields its base URL."""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
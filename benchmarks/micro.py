@@ -0,0 +1,266 @@
+"""
+Micro-benchmarks for the data-path helpers whose cost grows with data size.
+
+Each case builds a synthetic input (1k to 1M rows, wide tables, large
+stdout blobs) outside the measurement. It then times the helper (best of a
+few runs) and records its peak traced memory (one separate run under
+tracemalloc, since tracing slows execution down).
+
+Usage (from the repository root):
+
+    python -m benchmarks.micro                       # every case at every size
+    python -m benchmarks.micro --case clean_step --max-rows 100000
+    python -m benchmarks.micro --save-baseline       # record benchmarks/baselines/micro.json
+    python -m benchmarks.micro --compare --threshold 0.25
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.sql_fixer import fix_sql_query
+from workflows.database_analysis import extract_json_from_output, make_json_serializable
+from workflows.web_scraping import CleanStep, extract_keywords, sanitize_for_json
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+
+ROW_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+WIDE_COLUMN_SIZES = [100, 1_000]
+WIDE_TABLE_ROWS = 1_000
+SQL_TERM_SIZES = [10, 100, 1_000]
+
+# --- Synthetic inputs ---
+
+def scraped_table(rows: int, seed: int = 0) -> pd.DataFrame:
+    """A table shaped like a scraped Wikipedia table: numbers as text with currency, citations and percentages."""
+    rng = np.random.default_rng(seed)
+    gross = rng.integers(10**6, 3 * 10**9, rows)
+    return pd.DataFrame({
+        "Rank": [f"{i + 1}[{i % 7}]" if i % 5 == 0 else str(i + 1) for i in range(rows)],
+        "Peak": rng.integers(1, 100, rows).astype(str),
+        "Title": [f"Film title {i} [note {i % 3}]" for i in range(rows)],
+        "Worldwide gross": [f"${g:,}" for g in gross],
+        "Share (%)": [f"{p:.1f}%" for p in rng.random(rows) * 100],
+        "Year": rng.integers(1950, 2025, rows).astype(str),
+    })
+
+def wide_table(columns: int, rows: int = WIDE_TABLE_ROWS, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {}
+    for c in range(columns):
+        if c % 3 == 0:
+            data[f"Metric ({c})"] = [f"${v:,.2f}" for v in rng.random(rows) * 10**6]
+        elif c % 3 == 1:
+            data[f"Count {c}"] = rng.integers(0, 10**6, rows).astype(str)
+        else:
+            data[f"Label {c}"] = [f"label {v} [{v % 4}]" for v in rng.integers(0, 50, rows)]
+    return pd.DataFrame(data)
+
+def task_text(words: int) -> str:
+    vocabulary = ["Which", "film", "grossed", "the", "most", "before", "2000", "and", "what", "is",
+                  "correlation", "between", "rank", "peak", "draw", "scatterplot", "regression", "line"]
+    return " ".join(vocabulary[i % len(vocabulary)] for i in range(words))
+
+def result_records(rows: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Records as generated code returns them: numpy scalars, NaN/inf and nested lists."""
+    rng = np.random.default_rng(seed)
+    values = rng.random(rows)
+    values[::97] = np.nan
+    values[::101] = np.inf
+    ids = rng.integers(0, 10**6, rows)
+    return [{"id": ids[i], "value": float(values[i]), "score": values[i], "tags": ["a", i % 3]} for i in range(rows)]
+
+def analysis_result(rows: int, seed: int = 0) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({"court": rng.integers(1, 40, rows), "delay": rng.random(rows) * 365})
+    return {
+        "top_court": np.int64(33),
+        "slope": np.float64(0.42),
+        "delays": frame["delay"],
+        "courts": frame["court"].to_numpy(),
+        "rows": frame.head(1000),
+    }
+
+def script_stdout(lines: int, with_json: bool = True) -> str:
+    """Large stdout: progress logging followed by the final JSON answer (or no JSON at all)."""
+    log = "\n".join(f"processed batch {i}: rows={i * 100} elapsed={i * 0.01:.2f}s" for i in range(lines))
+    if not with_json:
+        return log
+    answer = json.dumps({"answer": [i for i in range(100)], "chart": "data:image/png;base64," + "A" * 1000})
+    return f"{log}\n{answer}\n"
+
+def llm_sql(terms: int) -> str:
+    conditions = " OR ".join(
+        f"(court = '{i}' AND JULIANDAY(decision_date) - JULIANDAY(date_of_registration) > {i})" for i in range(terms)
+    )
+    return (
+        "SELECT court, AVG(JULIANDAY(decision_date) - JULIANDAY(date_of_registration)) AS delay, "
+        "STRPTIME(date_of_registration, '%d-%m-%Y', 'UTC') AS registered "
+        f"FROM read_parquet('s3://bucket/data.parquet') WHERE {conditions} GROUP BY court"
+    )
+
+# --- Cases ---
+# Each case maps a size to a zero-argument callable running the helper on a prebuilt input.
+
+def _clean_step(rows: int) -> Callable[[], Any]:
+    step, data = CleanStep(), {"data": scraped_table(rows)}
+    return lambda: step.run(data)
+
+def _clean_step_wide(columns: int) -> Callable[[], Any]:
+    step, data = CleanStep(), {"data": wide_table(columns)}
+    return lambda: step.run(data)
+
+def _extract_keywords(words: int) -> Callable[[], Any]:
+    text = task_text(words)
+    return lambda: extract_keywords(text)
+
+def _sanitize_for_json(rows: int) -> Callable[[], Any]:
+    records = result_records(rows)
+    return lambda: sanitize_for_json(records)
+
+def _make_json_serializable(rows: int) -> Callable[[], Any]:
+    result = analysis_result(rows)
+    return lambda: make_json_serializable(result)
+
+def _extract_json(lines: int) -> Callable[[], Any]:
+    output = script_stdout(lines)
+    return lambda: extract_json_from_output(output)
+
+def _extract_json_missing(lines: int) -> Callable[[], Any]:
+    output = script_stdout(lines, with_json=False)
+    return lambda: extract_json_from_output(output)
+
+def _fix_sql_query(terms: int) -> Callable[[], Any]:
+    sql = llm_sql(terms)
+    return lambda: fix_sql_query(sql)
+
+CASES: Dict[str, Tuple[Callable[[int], Callable[[], Any]], List[int]]] = {
+    "clean_step": (_clean_step, ROW_SIZES),
+    "clean_step_wide": (_clean_step_wide, WIDE_COLUMN_SIZES),
+    "extract_keywords": (_extract_keywords, ROW_SIZES),
+    "sanitize_for_json": (_sanitize_for_json, ROW_SIZES),
+    "make_json_serializable": (_make_json_serializable, ROW_SIZES),
+    "extract_json_from_output": (_extract_json, ROW_SIZES),
+    "extract_json_from_output.no_json": (_extract_json_missing, ROW_SIZES),
+    "fix_sql_query": (_fix_sql_query, SQL_TERM_SIZES),
+}
+
+# --- Measurement ---
+
+def measure(func: Callable[[], Any], repeat: int, min_total_seconds: float) -> Dict[str, float]:
+    """Best-of-`repeat` wall time (stopping early once `min_total_seconds` is spent) and tracemalloc peak."""
+    timings = []
+    while len(timings) < repeat:
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+        if sum(timings) >= min_total_seconds:
+            break
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(timings), 6), "peak_bytes": peak, "runs": len(timings)}
+
+def run_suite(cases: List[str], max_size: int, repeat: int, min_total_seconds: float) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"cases": {}}
+    for name in cases:
+        build, sizes = CASES[name]
+        for size in sizes:
+            if size > max_size:
+                continue
+            func = build(size)
+            report["cases"][f"{name}[{size}]"] = measure(func, repeat, min_total_seconds)
+            print_result(f"{name}[{size}]", report["cases"][f"{name}[{size}]"])
+            del func
+    return report
+
+def print_result(label: str, result: Dict[str, float]):
+    print(f"  {label:<44} {result['seconds'] * 1000:>11.2f} ms  peak {result['peak_bytes'] / 1e6:>9.1f} MB")
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+                        memory_threshold: float, min_seconds: float) -> List[str]:
+    """
+    Returns a description of every time or peak-memory regression beyond its threshold (a fraction).
+    Cases faster than `min_seconds` in both runs are too noisy to compare on time.
+    """
+    regressions = []
+    for label, current in report["cases"].items():
+        previous = baseline.get("cases", {}).get(label)
+        if not previous:
+            continue
+        old_s, new_s = previous["seconds"], current["seconds"]
+        if max(old_s, new_s) >= min_seconds and new_s > old_s * (1 + threshold):
+            regressions.append(f"{label}: time {old_s * 1000:.2f}ms -> {new_s * 1000:.2f}ms")
+        old_peak, new_peak = previous["peak_bytes"], current["peak_bytes"]
+        if old_peak and new_peak > old_peak * (1 + memory_threshold):
+            regressions.append(f"{label}: peak memory {old_peak / 1e6:.1f}MB -> {new_peak / 1e6:.1f}MB")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="Run only this case (repeatable).")
+    parser.add_argument("--max-rows", type=int, default=max(ROW_SIZES), help="Skip larger sizes (rows, columns or SQL terms).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case (the best one is reported).")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="Stop repeating a case once this many seconds were spent on it.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Exit non-zero on regressions against the baseline.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative time regression.")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed relative peak-memory regression.")
+    parser.add_argument("--min-seconds", type=float, default=0.02,
+                        help="Cases faster than this are not compared on time.")
+    parser.add_argument("--output", help="Also write the JSON report to this path.")
+    args = parser.parse_args(argv)
+
+    # The helpers log per column and per fix; keep that out of the measurements.
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    cases = args.case or list(CASES)
+    print(f"Micro-benchmarks (best of {args.repeat}, peak = tracemalloc):")
+    report = run_suite(cases, args.max_rows, args.repeat, args.min_time)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        baseline = {"cases": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        # Partial runs (--case / --max-rows) update only the cases they measured.
+        baseline.setdefault("cases", {}).update(report["cases"])
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+            return 1
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.threshold,
+                                              args.memory_threshold, args.min_seconds)
+        if regressions:
+            print("\nRegressions against baseline:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+DEFAULT_RESPONSES_PATH = os.path.join(FIXTURES_DIR, "replay_responses.json")
+
+def _prompt_text(prompt: Any) -> str:
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, (list, tuple)):
+        return "\n".join(str(getattr(message, "content", message)) for message in prompt)
+    return str(prompt)
+
+class ReplayChatModel:
+    """
+    A deterministic stand-in for the Gemini chat model. Each prompt is matched
+    against recorded responses by substring (first match wins), and an optional
+    fixed latency simulates the provider's response time.
+    """
+    def __init__(self, responses_path: str = DEFAULT_RESPONSES_PATH, latency_seconds: float = 0.0):
+        with open(responses_path, encoding="utf-8") as f:
+            self.responses: List[Dict[str, str]] = json.load(f)
+        self.latency_seconds = latency_seconds
+        self.calls: Dict[str, int] = {}
+
+    def _match(self, prompt: Any) -> Dict[str, str]:
+        text = _prompt_text(prompt)
+        for entry in self.responses:
+            if entry["match"] in text:
+                return entry
+        raise LookupError(f"No replay response matches prompt starting with: {text[:120]!r}")
+
+    async def ainvoke(self, input, config: Optional[Dict[str, Any]] = None, **kwargs) -> AIMessage:
+        entry = self._match(input)
+        self.calls[entry["name"]] = self.calls.get(entry["name"], 0) + 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return AIMessage(content=entry["response"])
+
+    def invoke(self, input, config: Optional[Dict[str, Any]] = None, **kwargs) -> AIMessage:
+        return AIMessage(content=self._match(input)["response"])
@@ -0,0 +1,155 @@
+"""
+Content-addressed storage for charts and large tables produced by workflows.
+
+Generated code still returns plots as base64 data URIs (the prompts and many
+tasks require that), and tables as JSON lists. `externalize_artifacts` walks a
+result and moves each data URI, and each table larger than
+ARTIFACT_TABLE_MIN_BYTES, into ARTIFACT_DIR under the SHA-256 of its content.
+It replaces them with `/api/artifacts/<sha256>.<ext>` references.
+Identical charts are therefore stored and downloaded once. Clients can cache
+them forever: the content behind a reference never changes.
+`sweep_artifacts` deletes artifacts older than ARTIFACT_MAX_AGE_SECONDS
+(storing an artifact again renews it) and, oldest first, any beyond
+ARTIFACT_MAX_BYTES; references to deleted artifacts then return 404.
+`inline_artifacts` reverses the substitution for clients that need the old
+inline format.
+"""
+import base64
+import binascii
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import time
+from typing import Any, List, Optional, Tuple
+
+from core.config import ARTIFACT_DIR, ARTIFACT_TABLE_MIN_BYTES, ARTIFACT_MAX_AGE_SECONDS, ARTIFACT_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_URL_PREFIX = "/api/artifacts/"
+ARTIFACT_ID_PATTERN = re.compile(r"^([0-9a-f]{64})\.([a-z0-9]+)$")
+_DATA_URI_PATTERN = re.compile(r"^data:([\w.+-]+/[\w.+-]+);base64,", re.IGNORECASE)
+_REFERENCE_PATTERN = re.compile(r"^" + re.escape(ARTIFACT_URL_PREFIX) + r"([0-9a-f]{64}\.[a-z0-9]+)$")
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/svg+xml": "svg",
+               "image/gif": "gif", "application/json": "json"}
+
+def artifact_path(artifact_id: str) -> Optional[str]:
+    """Returns the file path of an artifact id ("<sha256>.<ext>"), or None if the id is malformed."""
+    match = ARTIFACT_ID_PATTERN.match(artifact_id)
+    if not match:
+        return None
+    digest = match.group(1)
+    return os.path.join(ARTIFACT_DIR, digest[:2], artifact_id)
+
+def media_type_for(artifact_id: str) -> str:
+    return mimetypes.guess_type(artifact_id)[0] or "application/octet-stream"
+
+def save_artifact(content: bytes, media_type: str) -> str:
+    """Stores `content` under its SHA-256 (once) and returns the artifact id."""
+    extension = _EXTENSIONS.get(media_type.lower()) or (mimetypes.guess_extension(media_type) or ".bin").lstrip(".")
+    artifact_id = f"{hashlib.sha256(content).hexdigest()}.{extension}"
+    path = artifact_path(artifact_id)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so concurrent workers never serve a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    else:
+        # Reuse renews the artifact for `sweep_artifacts`.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    return artifact_id
+
+def sweep_artifacts(max_age_seconds: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+    """
+    Deletes artifacts older than `max_age_seconds`, then the oldest ones until the rest
+    fit in `max_bytes` (defaults: ARTIFACT_MAX_AGE_SECONDS, ARTIFACT_MAX_BYTES; 0 disables
+    either rule). Leftover temporary files are only removed by age. Returns the number deleted.
+    """
+    max_age_seconds = ARTIFACT_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    max_bytes = ARTIFACT_MAX_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    kept: List[Tuple[float, int, str]] = []
+    removed = 0
+    for directory, _, filenames in os.walk(ARTIFACT_DIR):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+                if max_age_seconds and now - stat.st_mtime > max_age_seconds:
+                    os.remove(path)
+                    removed += 1
+                elif ARTIFACT_ID_PATTERN.match(filename):
+                    kept.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue  # Removed concurrently by another worker.
+    total = sum(size for _, size, _ in kept)
+    if max_bytes and total > max_bytes:
+        for _, size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+    if removed:
+        logger.info(f"Artifact sweep deleted {removed} files from {ARTIFACT_DIR}.")
+    return removed
+
+def _decode_data_uri(value: str) -> Optional[Tuple[bytes, str]]:
+    match = _DATA_URI_PATTERN.match(value)
+    if not match:
+        return None
+    try:
+        return base64.b64decode(value[match.end():], validate=True), match.group(1)
+    except (binascii.Error, ValueError):
+        return None
+
+def _is_table(value: list) -> bool:
+    return len(value) > 1 and (all(isinstance(row, dict) for row in value) or all(isinstance(row, list) for row in value))
+
+def externalize_artifacts(result: Any) -> Any:
+    """Returns `result` with data URIs and large tables replaced by artifact references."""
+    if isinstance(result, str):
+        decoded = _decode_data_uri(result)
+        if decoded is None:
+            return result
+        return ARTIFACT_URL_PREFIX + save_artifact(*decoded)
+    if isinstance(result, dict):
+        return {key: externalize_artifacts(value) for key, value in result.items()}
+    if isinstance(result, list):
+        if _is_table(result):
+            encoded = json.dumps(result).encode("utf-8")
+            if len(encoded) >= ARTIFACT_TABLE_MIN_BYTES:
+                return ARTIFACT_URL_PREFIX + save_artifact(encoded, "application/json")
+        return [externalize_artifacts(value) for value in result]
+    return result
+
+def inline_artifacts(result: Any) -> Any:
+    """Reverses `externalize_artifacts`: references become data URIs (images) or the tables themselves."""
+    if isinstance(result, str):
+        match = _REFERENCE_PATTERN.match(result)
+        path = artifact_path(match.group(1)) if match else None
+        if path is None or not os.path.exists(path):
+            return result
+        with open(path, "rb") as f:
+            content = f.read()
+        media_type = media_type_for(match.group(1))
+        if media_type == "application/json":
+            return json.loads(content)
+        return f"data:{media_type};base64,{base64.b64encode(content).decode('ascii')}"
+    if isinstance(result, dict):
+        return {key: inline_artifacts(value) for key, value in result.items()}
+    if isinstance(result, list):
+        return [inline_artifacts(value) for value in result]
+    return result
@@ -1,14 +1,55 @@
+import asyncio
+import hashlib
+import importlib
+import json
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any
-from core.config import get_chat_model
+from typing import Dict, Any, Callable, List, Union
+from core.config import get_shared_chat_model, RESULT_CACHE_TTL_SECONDS
+from core.artifacts import externalize_artifacts
+from core.state import RESULTS, get_state_store
+from core.timing import current_workflow, stage_timer
+from utils.tokens import load_encoding
 
 logger = logging.getLogger(__name__)
 
+# A workflow factory is either a callable returning a workflow instance or an
+# import path of the form "package.module:ClassName". Import paths keep heavy
+# dependencies (langchain, pandas, matplotlib, ...) out of the startup path.
+WorkflowFactory = Union[str, Callable[[], "BaseWorkflow"]]
+
+def _resolve_factory(factory: WorkflowFactory) -> Callable[[], "BaseWorkflow"]:
+    """Imports a "module:attribute" factory path, or returns a callable factory unchanged."""
+    if not isinstance(factory, str):
+        return factory
+    module_name, _, attr_name = factory.partition(":")
+    if not attr_name:
+        raise ValueError(f"Workflow factory path '{factory}' must look like 'package.module:ClassName'.")
+    module = importlib.import_module(module_name)
+    return getattr(module, attr_name)
+
+def result_cache_key(workflow_type: str, input_data: Dict[str, Any]) -> str:
+    """Key of a request in the shared result cache: the workflow and the task text."""
+    payload = json.dumps({"workflow": workflow_type, "task": input_data.get("task_description", "")}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 class BaseWorkflow(ABC):
     """Base class for all workflows, ensuring an LLM instance is available."""
     def __init__(self, llm=None, **kwargs):
-        self.llm = llm or get_chat_model()
+        self._llm = llm
+
+    @property
+    def llm(self):
+        """The shared chat model, looked up on first access so constructing a workflow stays cheap."""
+        if self._llm is None:
+            self._llm = get_shared_chat_model()
+        return self._llm
+
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
 
     @abstractmethod
     async def execute(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -18,30 +59,132 @@ class BaseWorkflow(ABC):
 class WorkflowOrchestrator:
     """Orchestrates and executes the appropriate workflow based on the request."""
     def __init__(self):
-        self.workflows = {}
-        self.llm = get_chat_model()
+        self.workflows: Dict[str, BaseWorkflow] = {}
+        self.load_times: Dict[str, Dict[str, float]] = {}
+        self._factories: Dict[str, WorkflowFactory] = {}
+        self._load_lock = threading.Lock()
+        self._llm = None
+
+    @property
+    def llm(self):
+        """The shared chat model, looked up on first access."""
+        if self._llm is None:
+            self._llm = get_shared_chat_model()
+        return self._llm
+
+    @property
+    def available_workflows(self) -> List[str]:
+        """Names of every registered workflow, loaded or not."""
+        return sorted(set(self.workflows) | set(self._factories))
+
+    @property
+    def is_ready(self) -> bool:
+        """True once every lazily registered workflow has been loaded."""
+        return all(name in self.workflows for name in self._factories)
 
     def register_workflow(self, name: str, workflow: BaseWorkflow):
         """Adds a workflow to the orchestrator's registry."""
         self.workflows[name] = workflow
 
-    async def execute_workflow(self, workflow_type: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Executes a registered workflow by its name."""
-        if workflow_type not in self.workflows:
+    def register_workflow_factory(self, name: str, factory: WorkflowFactory):
+        """Registers a workflow that is only imported and built on first use (or during warm-up)."""
+        self._factories[name] = factory
+
+    def get_workflow(self, name: str) -> BaseWorkflow:
+        """Returns a workflow instance, importing and constructing it on first use."""
+        workflow = self.workflows.get(name)
+        if workflow is not None:
+            return workflow
+        if name not in self._factories:
+            raise ValueError(f"Workflow '{name}' not recognized.")
+
+        with self._load_lock:
+            if name not in self.workflows:
+                started = time.perf_counter()
+                factory = _resolve_factory(self._factories[name])
+                imported = time.perf_counter()
+                self.workflows[name] = factory()
+                finished = time.perf_counter()
+                self.load_times[name] = {
+                    "import_seconds": round(imported - started, 4),
+                    "init_seconds": round(finished - imported, 4),
+                }
+                logger.info(f"Loaded workflow '{name}' in {finished - started:.2f}s "
+                            f"(import {imported - started:.2f}s, init {finished - imported:.2f}s)")
+        return self.workflows[name]
+
+    async def warm_up(self):
+        """
+        Loads every registered workflow, its chat model and the tokenizer in a
+        worker thread, so the event loop keeps serving requests while heavy
+        modules import and the tokenizer's BPE file downloads.
+        """
+        await asyncio.to_thread(load_encoding)
+        for name in list(self._factories):
+            try:
+                workflow = await asyncio.to_thread(self.get_workflow, name)
+                await asyncio.to_thread(lambda: workflow.llm)
+            except Exception as e:
+                logger.error(f"Failed to warm up workflow '{name}': {e}")
+        logger.info(f"Workflow warm-up finished. Ready: {self.is_ready}")
+
+    def import_report(self) -> Dict[str, Any]:
+        """Summarises which workflows are loaded and how long each took to import and build."""
+        return {
+            "loaded": dict(self.load_times),
+            "pending": [name for name in self._factories if name not in self.workflows],
+        }
+
+    async def execute_workflow(self, workflow_type: str, input_data: Dict[str, Any],
+                               use_cache: bool = False) -> Dict[str, Any]:
+        """
+        Executes a registered workflow by its name. Charts and large tables in the
+        result are replaced by artifact references (see `core.artifacts`). With
+        `use_cache`, an identical earlier request answered by any worker process is
+        served from the shared result cache, and successful results are added to it.
+        """
+        if workflow_type not in self.workflows and workflow_type not in self._factories:
             raise ValueError(f"Workflow '{workflow_type}' not recognized.")
-        
-        workflow_instance = self.workflows[workflow_type]
-        return await workflow_instance.execute(input_data)
+
+        cache_key = result_cache_key(workflow_type, input_data) if use_cache and RESULT_CACHE_TTL_SECONDS > 0 else None
+        if cache_key is not None:
+            try:
+                cached = await get_state_store().aget(RESULTS, cache_key)
+            except Exception as e:
+                logger.warning(f"Result cache lookup failed: {e}")
+                cached = None
+            if cached is not None:
+                logger.info(f"Serving '{workflow_type}' result from the shared result cache.")
+                return cached
+
+        workflow_instance = self.workflows.get(workflow_type)
+        if workflow_instance is None:
+            workflow_instance = await asyncio.to_thread(self.get_workflow, workflow_type)
+
+        token = current_workflow.set(workflow_type)
+        try:
+            with stage_timer("total"):
+                result = await workflow_instance.execute(input_data)
+            # Charts and large tables go to the artifact store; the result (and cache) keep references.
+            with stage_timer("artifacts"):
+                result = await asyncio.to_thread(externalize_artifacts, result)
+        finally:
+            current_workflow.reset(token)
+
+        if cache_key is not None and not (isinstance(result, dict) and "error" in result):
+            try:
+                await get_state_store().aset(RESULTS, cache_key, result, ttl=RESULT_CACHE_TTL_SECONDS)
+            except Exception as e:
+                logger.warning(f"Could not cache the '{workflow_type}' result: {e}")
+        return result
 
 class AdvancedWorkflowOrchestrator(WorkflowOrchestrator):
     """
     The main orchestrator that registers and manages all available workflows.
+    Workflows are registered as lazy factories; nothing heavy is imported here.
     """
     def __init__(self):
         super().__init__()
-        from workflows.web_scraping import MultiStepWebScrapingWorkflow
-        from workflows.database_analysis import DatabaseAnalysisWorkflow
-        
-        self.register_workflow("multi_step_web_scraping", MultiStepWebScrapingWorkflow())
-        self.register_workflow("database_analysis", DatabaseAnalysisWorkflow())
-        # Register other workflows here as they are created
\ No newline at end of file
+        self.register_workflow_factory("multi_step_web_scraping", "workflows.web_scraping:MultiStepWebScrapingWorkflow")
+        self.register_workflow_factory("database_analysis", "workflows.database_analysis:DatabaseAnalysisWorkflow")
+        # Register other workflows here as they are created
@@ -1,5 +1,6 @@
 # core/config.py
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -22,6 +23,117 @@ DEFAULT_MODEL = "gemini-2.0-flash"
 TEMPERATURE = 0.7
 MAX_TOKENS = 2000
 
+# --- Client-side Rate Limiting ---
+# The shared chat model queues calls that would exceed these limits instead of
+# letting the provider reject them with HTTP 429.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+
+# --- Prompt Context ---
+# Upper bound (in tokens) for the DataFrame schema and sample rows embedded in prompts.
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "1500"))
+
+# --- Web Scraping ---
+# Pages are fetched concurrently, but at most SCRAPE_PER_HOST_CONCURRENCY at a time per host
+# and with request starts to the same host spaced by SCRAPE_POLITENESS_DELAY_SECONDS.
+SCRAPE_PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "2"))
+SCRAPE_POLITENESS_DELAY_SECONDS = float(os.getenv("SCRAPE_POLITENESS_DELAY_SECONDS", "0.25"))
+# Upper bound on pages fetched per task, including followed pagination links.
+SCRAPE_MAX_PAGES = int(os.getenv("SCRAPE_MAX_PAGES", "10"))
+# Pages whose static HTML has no tables are rendered in a pooled headless browser (Playwright).
+BROWSER_FALLBACK_ENABLED = os.getenv("BROWSER_FALLBACK_ENABLED", "true").lower() == "true"
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+# A browser context is closed and replaced after this many renders, to bound memory growth.
+BROWSER_CONTEXT_MAX_USES = int(os.getenv("BROWSER_CONTEXT_MAX_USES", "50"))
+BROWSER_RENDER_TIMEOUT_SECONDS = float(os.getenv("BROWSER_RENDER_TIMEOUT_SECONDS", "15"))
+# After a failed browser launch, the next attempt waits this long, doubling per failure up to 10 minutes.
+BROWSER_LAUNCH_RETRY_SECONDS = float(os.getenv("BROWSER_LAUNCH_RETRY_SECONDS", "30"))
+
+# --- Observability ---
+# Stage timings are exported as OpenTelemetry spans when an OTLP endpoint is configured
+# (requires opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http).
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "data-analysis-platform")
+
+# --- Profiling of Generated Code ---
+# Requests can opt in to profiling; additionally a fraction of all requests is sampled.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ARTIFACT_DIR = os.getenv("PROFILE_ARTIFACT_DIR", os.path.join("artifacts", "profiles"))
+# Profiles of a task are deleted this long after its last profiled run (0 keeps them forever).
+PROFILE_MAX_AGE_SECONDS = float(os.getenv("PROFILE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+# --- Generated-Code Sandbox ---
+# "inprocess" (default) execs web-scraping analysis code inside the API worker (fast, but
+# unprotected); "governed" runs it in a resource-limited child process, which pays interpreter
+# and pandas/matplotlib start-up on every run (p50 1.2s -> 7.6s in benchmarks.e2e_load on one core).
+# Database scripts always run in the governed sandbox. A limit of 0 disables it.
+SANDBOX_MODE = os.getenv("SANDBOX_MODE", "inprocess")
+SANDBOX_MEMORY_LIMIT_MB = int(os.getenv("SANDBOX_MEMORY_LIMIT_MB", "2048"))
+SANDBOX_CPU_LIMIT_SECONDS = int(os.getenv("SANDBOX_CPU_LIMIT_SECONDS", "90"))
+SANDBOX_TIMEOUT_SECONDS = float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "120"))
+SANDBOX_MAX_OUTPUT_BYTES = int(os.getenv("SANDBOX_MAX_OUTPUT_BYTES", str(16 * 1024 * 1024)))
+SANDBOX_THREADS = int(os.getenv("SANDBOX_THREADS", "2"))
+# Optional delegated cgroup v2 directory; each execution then gets its own child cgroup.
+SANDBOX_CGROUP_ROOT = os.getenv("SANDBOX_CGROUP_ROOT")
+# Sandbox runs allowed at once per worker process; further runs wait for a free slot.
+SANDBOX_MAX_CONCURRENCY = int(os.getenv("SANDBOX_MAX_CONCURRENCY", str(max(2, os.cpu_count() or 1))))
+
+# --- Request Deadlines ---
+# Every API request gets this much time end to end. Stages size their own timeouts
+# (fetches, renders, LLM calls, sandbox runs) to what is left of it.
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "300"))
+# Upper bound for a single LLM call, and for the connect/read phases of a page fetch.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+SCRAPE_FETCH_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_FETCH_TIMEOUT_SECONDS", "20"))
+# How often a running request checks whether its client has disconnected (and cancels its work).
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+
+# --- Batch Submission ---
+# POST /api/batch accepts up to BATCH_MAX_TASKS questions files and runs at most
+# BATCH_CONCURRENCY of them at once; each task gets its own REQUEST_TIMEOUT_SECONDS deadline.
+BATCH_MAX_TASKS = int(os.getenv("BATCH_MAX_TASKS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# --- Shared State ---
+# Task statuses and caches live in a store shared by all worker processes:
+# "sqlite:///<path>" (default), "memory://" or a "package.module:ClassName" StateStore.
+STATE_STORE_URL = os.getenv("STATE_STORE_URL", "sqlite:///" + os.path.join("artifacts", "state.db"))
+# Least recently used entries are evicted once the store holds more than this many bytes.
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(256 * 1024 * 1024)))
+STATE_TASK_TTL_SECONDS = float(os.getenv("STATE_TASK_TTL_SECONDS", str(24 * 3600)))
+# Identical requests within this window are answered from the result cache (0 disables it).
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+TABLE_SELECTION_CACHE_TTL_SECONDS = float(os.getenv("TABLE_SELECTION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# --- Artifacts ---
+# Charts and large tables are stored here by content hash and returned as /api/artifacts/... references.
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join("artifacts", "objects"))
+# Tables (lists of rows) whose JSON is at least this large are stored as artifacts too.
+ARTIFACT_TABLE_MIN_BYTES = int(os.getenv("ARTIFACT_TABLE_MIN_BYTES", str(64 * 1024)))
+# "reference" (default) or "inline": the legacy format with base64 data URIs embedded in the JSON.
+ARTIFACT_MODE = os.getenv("ARTIFACT_MODE", "reference")
+# Artifacts not stored or reused for this long are deleted (0 keeps them forever); keep it
+# above STATE_TASK_TTL_SECONDS so results fetched from /api/tasks still resolve.
+ARTIFACT_MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+# Beyond this total size the least recently stored artifacts are deleted first (0 = no limit).
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+ARTIFACT_SWEEP_INTERVAL_SECONDS = float(os.getenv("ARTIFACT_SWEEP_INTERVAL_SECONDS", "3600"))
+
+# --- Cleaned-DataFrame Cache ---
+# Follow-up questions on the same page or file reuse the cleaned DataFrame and its prompt
+# summary, skipping fetch, parse and cleaning. Frames beyond FRAME_CACHE_MAX_BYTES of memory
+# are spilled to Parquet; spilled files beyond FRAME_CACHE_SPILL_MAX_BYTES are deleted.
+FRAME_CACHE_ENABLED = os.getenv("FRAME_CACHE_ENABLED", "true").lower() == "true"
+FRAME_CACHE_MAX_BYTES = int(os.getenv("FRAME_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+FRAME_CACHE_SPILL_DIR = os.getenv("FRAME_CACHE_SPILL_DIR", os.path.join("artifacts", "frames"))
+FRAME_CACHE_SPILL_MAX_BYTES = int(os.getenv("FRAME_CACHE_SPILL_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+FRAME_CACHE_TTL_SECONDS = float(os.getenv("FRAME_CACHE_TTL_SECONDS", "1800"))
+
+# --- Startup ---
+# When enabled, workflows (and their heavy imports) are loaded in a background
+# task right after the server starts, instead of on the first request.
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
 def get_chat_model():
     """
     Get a ChatGoogleGenerativeAI model instance with the current configuration.
@@ -42,4 +154,33 @@ def get_chat_model():
         raise ImportError("Could not import ChatGoogleGenerativeAI. Please run 'pip install langchain-google-genai'.")
     except Exception as e:
         print(f"Error initializing Gemini chat model: {e}")
-        return None
\ No newline at end of file
+        return None
+
+_shared_chat_model = None
+_shared_chat_model_lock = threading.Lock()
+
+def get_shared_chat_model():
+    """
+    Get the process-wide chat model used by every workflow. It is created once,
+    keeps its client connections open, and is wrapped in a client-side rate
+    limiter, so callers should use its native async `ainvoke`.
+    """
+    global _shared_chat_model
+    if _shared_chat_model is None:
+        with _shared_chat_model_lock:
+            if _shared_chat_model is None:
+                model = get_chat_model()
+                if model is None:
+                    return None
+                from core.rate_limiter import RateLimitedChatModel
+                _shared_chat_model = RateLimitedChatModel(model, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+    return _shared_chat_model
+
+def set_shared_chat_model(model):
+    """
+    Replace the shared chat model, e.g. with a fake model in tests or benchmarks.
+    Passing None makes the next `get_shared_chat_model()` call build a fresh one.
+    """
+    global _shared_chat_model
+    with _shared_chat_model_lock:
+        _shared_chat_model = model
@@ -0,0 +1,81 @@
+"""
+Request-scoped deadlines.
+
+The API opens a `request_deadline()` around each request. Stages read the
+time left from a context variable (which asyncio tasks inherit) to size
+their own timeouts: HTTP fetches, browser renders, LLM calls and sandbox
+runs. `timeout_for(default)` returns the smaller of the stage's own limit
+and the time left, and raises `DeadlineExceeded` once the deadline has
+passed. A stage that would start after the deadline fails immediately
+instead of running work nobody will receive. A stage whose capped timeout
+fired calls `raise_if_exceeded`, so the overrun surfaces as `DeadlineExceeded`
+(mapped to 408 by the API) rather than as the stage's own error.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# A stage timeout capped by the deadline may fire a hair before it (timer resolution).
+EXPIRY_SLACK_SECONDS = 0.05
+
+# Absolute deadline (time.monotonic()) of the request being served, if any.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a stage would start (or continue) after the request deadline."""
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Sets a deadline `seconds` from now for the code inside the block (and the tasks it starts).
+    A nested deadline can only shorten the enclosing one. None or 0 leaves it unchanged.
+    """
+    current = _deadline.get()
+    deadline = time.monotonic() + seconds if seconds else None
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left until the request deadline (may be negative), or None if there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def check(stage: str = "request"):
+    """Raises `DeadlineExceeded` if the request deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded before {stage} ({-left:.1f}s over).")
+
+def raise_if_exceeded(stage: str, cause: Optional[BaseException] = None):
+    """
+    Raises `DeadlineExceeded` (chained to `cause`) if the request deadline has passed, so a
+    stage that failed because its deadline-capped timeout fired reports the overrun itself.
+    """
+    left = remaining()
+    if left is not None and left <= EXPIRY_SLACK_SECONDS:
+        raise DeadlineExceeded(f"Request deadline exceeded during {stage}.") from cause
+
+def timeout_for(default: float, stage: str = "request") -> float:
+    """
+    The timeout a stage should use: its own `default` limit, capped by the time left
+    until the request deadline. A `default` of 0 means "no limit of its own".
+    """
+    check(stage)
+    left = remaining()
+    if left is None:
+        return default
+    return min(default, left) if default else left
+
+def can_finish(estimated_seconds: float) -> bool:
+    """Whether work expected to take `estimated_seconds` fits before the request deadline."""
+    left = remaining()
+    return left is None or left >= estimated_seconds
@@ -0,0 +1,215 @@
+"""
+Per-process cache of cleaned DataFrames for follow-up questions.
+
+An entry holds a cleaned DataFrame, its prompt summary and a schema
+fingerprint. It is keyed by its data source (the page URLs), the
+inputs that chose it among the source's tables (if any) and the version of
+the cleaning logic, so changing the cleaning code invalidates old entries. The cache is bounded by the DataFrames' total in-memory size
+(FRAME_CACHE_MAX_BYTES), not by entry count. The least recently used frames
+are spilled to Parquet under FRAME_CACHE_SPILL_DIR, and reloading them
+costs a file read instead of a fetch, parse and clean. Entries unused for
+FRAME_CACHE_TTL_SECONDS expire.
+
+`load_once` deduplicates concurrent loads of the same source (e.g. many tasks
+of one batch scraping the same URL): the first caller loads, the others await
+its result.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+import pandas as pd
+
+from core.config import FRAME_CACHE_MAX_BYTES, FRAME_CACHE_SPILL_DIR, FRAME_CACHE_SPILL_MAX_BYTES, FRAME_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def frame_cache_key(sources: Iterable[str], cleaning_version: str, selection: Iterable[str] = ()) -> str:
+    """
+    Cache key of a data source (its URLs) under a given cleaning version.
+    `selection` holds the question-dependent inputs that picked the table, e.g. its keywords.
+    """
+    payload = "\n".join(sorted(sources)) + f"\ncleaning:{cleaning_version}"
+    selection = sorted(set(selection))
+    if selection:
+        payload += "\nselection:" + ",".join(selection)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """A short hash of the column names and dtypes, identifying the frame's schema."""
+    schema = ";".join(f"{col}:{dtype}" for col, dtype in df.dtypes.items())
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+@dataclass
+class CachedFrame:
+    df: Optional[pd.DataFrame]
+    summary: Dict[str, Any]
+    fingerprint: str
+    nbytes: int
+    last_used: float
+    spill_path: Optional[str] = None
+    spill_bytes: int = 0
+
+class DataFrameCache:
+    """Memory-bounded LRU of cleaned DataFrames that spills evicted frames to Parquet."""
+    def __init__(self, max_bytes: int = FRAME_CACHE_MAX_BYTES, spill_dir: str = FRAME_CACHE_SPILL_DIR,
+                 spill_max_bytes: int = FRAME_CACHE_SPILL_MAX_BYTES, ttl: float = FRAME_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.ttl = ttl
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedFrame]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: str) -> Optional[CachedFrame]:
+        """
+        Returns the entry for `key` (reloading a spilled frame from Parquet), or None.
+        Blocking for spilled entries; call it from a worker thread in async code.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.last_used > self.ttl:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.df is None:
+                try:
+                    entry.df = pd.read_parquet(entry.spill_path)
+                except Exception as e:
+                    logger.warning(f"Could not reload spilled frame {key[:12]}: {e}")
+                    self._drop(key)
+                    self.misses += 1
+                    return None
+                self.memory_bytes += entry.nbytes
+                logger.info(f"Reloaded cached frame {key[:12]} from {entry.spill_path}")
+            entry.last_used = time.time()
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._enforce_limits()
+            return entry
+
+    def put(self, key: str, df: pd.DataFrame, summary: Dict[str, Any]) -> CachedFrame:
+        """Caches a cleaned frame and its summary, evicting or spilling older frames as needed."""
+        entry = CachedFrame(
+            df=df, summary=summary, fingerprint=schema_fingerprint(df),
+            nbytes=int(df.memory_usage(index=True, deep=True).sum()), last_used=time.time(),
+        )
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self.memory_bytes += entry.nbytes
+            self._enforce_limits()
+        return entry
+
+    def _enforce_limits(self):
+        # Spill least recently used in-memory frames until the in-memory total fits.
+        for key, entry in list(self._entries.items()):
+            if self.memory_bytes <= self.max_bytes:
+                break
+            if entry.df is not None and key != next(reversed(self._entries)):
+                self._spill(key, entry)
+        # Then drop the oldest spilled files past the disk budget.
+        spilled = sum(entry.spill_bytes for entry in self._entries.values() if entry.df is None)
+        for key, entry in list(self._entries.items()):
+            if spilled <= self.spill_max_bytes:
+                break
+            if entry.df is None:
+                spilled -= entry.spill_bytes
+                self._drop(key)
+
+    def _spill(self, key: str, entry: CachedFrame):
+        path = entry.spill_path or os.path.join(self.spill_dir, f"{key}.parquet")
+        try:
+            if not os.path.exists(path):
+                os.makedirs(self.spill_dir, exist_ok=True)
+                entry.df.to_parquet(path, index=False)
+            entry.spill_path = path
+            entry.spill_bytes = os.path.getsize(path)
+            logger.info(f"Spilled cached frame {key[:12]} ({entry.nbytes / 1e6:.1f} MB in memory) to {path}")
+        except Exception as e:
+            # e.g. object columns mixing types that Parquet cannot represent.
+            logger.info(f"Could not spill frame {key[:12]} to Parquet, evicting it instead: {e}")
+            self._drop(key)
+            return
+        self.memory_bytes -= entry.nbytes
+        entry.df = None
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.df is not None:
+            self.memory_bytes -= entry.nbytes
+        if entry.spill_path and os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "in_memory": sum(1 for entry in self._entries.values() if entry.df is not None),
+                "memory_bytes": self.memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+_frame_cache: Optional[DataFrameCache] = None
+_frame_cache_lock = threading.Lock()
+
+def get_frame_cache() -> DataFrameCache:
+    """Returns the process-wide cleaned-DataFrame cache."""
+    global _frame_cache
+    if _frame_cache is None:
+        with _frame_cache_lock:
+            if _frame_cache is None:
+                _frame_cache = DataFrameCache()
+    return _frame_cache
+
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+
+async def load_once(key: str, load: Callable[[], Awaitable[T]]) -> T:
+    """
+    Runs `load()` once for all concurrent callers with the same `key` (single flight).
+    Callers arriving while a load is in flight await its result or exception. If the
+    loading caller is cancelled, one of the waiting callers takes over the load.
+    """
+    loop = asyncio.get_running_loop()
+    per_loop = _inflight.setdefault(loop, {})
+    while key in per_loop:
+        leader = per_loop[key]
+        try:
+            return await asyncio.shield(leader)
+        except asyncio.CancelledError:
+            if not leader.cancelled():
+                raise
+
+    future = loop.create_future()
+    # Mark the outcome as retrieved even when nobody else was waiting for it.
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    per_loop[key] = future
+    try:
+        result = await load()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        per_loop.pop(key, None)
+    future.set_result(result)
+    return result
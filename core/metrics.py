@@ -0,0 +1,127 @@
+import logging
+import os
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from core.config import OTEL_EXPORTER_OTLP_ENDPOINT, OTEL_SERVICE_NAME
+from core.timing import add_stage_listener, add_span_factory
+
+logger = logging.getLogger(__name__)
+
+# --- Prometheus (optional dependency) ---
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    logger.warning("prometheus_client is not installed; /metrics will be unavailable.")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_DURATION = Histogram(
+        "workflow_stage_duration_seconds", "Time spent in each workflow stage.",
+        ["workflow", "stage", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+    LLM_CALL_DURATION = Histogram(
+        "llm_call_duration_seconds", "Wall time of LLM calls, excluding rate-limiter queueing.",
+        ["outcome"], buckets=LATENCY_BUCKETS,
+    )
+    LLM_QUEUE_WAIT = Histogram(
+        "llm_rate_limit_wait_seconds", "Time LLM calls spent queued by the client-side rate limiter.",
+        buckets=LATENCY_BUCKETS,
+    )
+    LLM_TOKENS = Counter("llm_tokens_total", "Tokens sent to and received from the LLM.", ["direction"])
+    SANDBOX_DURATION = Histogram(
+        "sandbox_execution_duration_seconds", "Wall time of generated-code executions.",
+        ["mode", "outcome"], buckets=LATENCY_BUCKETS,
+    )
+    RETRIES = Counter("workflow_retries_total", "Retries performed by workflows.", ["workflow", "kind"])
+    PAYLOAD_BYTES = Histogram(
+        "payload_size_bytes", "Sizes of payloads flowing through the pipeline.", ["kind"], buckets=SIZE_BUCKETS,
+    )
+    HTTP_REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds", "End-to-end HTTP request latency.",
+        ["method", "endpoint", "status"], buckets=LATENCY_BUCKETS,
+    )
+
+def _record_stage(workflow: str, stage: str, seconds: float, failed: bool):
+    STAGE_DURATION.labels(workflow, stage, "error" if failed else "ok").observe(seconds)
+
+if PROMETHEUS_AVAILABLE:
+    add_stage_listener(_record_stage)
+
+def observe_llm_call(seconds: float, outcome: str, queued_seconds: float = 0.0,
+                     input_tokens: int = 0, output_tokens: int = 0):
+    """Records one LLM call: its duration, rate-limiter queueing and token usage."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    LLM_CALL_DURATION.labels(outcome).observe(seconds)
+    LLM_QUEUE_WAIT.observe(queued_seconds)
+    if input_tokens:
+        LLM_TOKENS.labels("input").inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels("output").inc(output_tokens)
+
+def observe_sandbox(mode: str, seconds: float, outcome: str):
+    """Records one generated-code execution (`mode` is "inprocess", "governed" or "subprocess")."""
+    if PROMETHEUS_AVAILABLE:
+        SANDBOX_DURATION.labels(mode, outcome).observe(seconds)
+
+def record_retry(workflow: str, kind: str):
+    """Counts a retry, e.g. a repair attempt of failed generated code."""
+    if PROMETHEUS_AVAILABLE:
+        RETRIES.labels(workflow, kind).inc()
+
+def observe_payload(kind: str, size_bytes: int):
+    """Records the size of a payload such as fetched HTML, script stdout or a response body."""
+    if PROMETHEUS_AVAILABLE:
+        PAYLOAD_BYTES.labels(kind).observe(size_bytes)
+
+def observe_http_request(method: str, endpoint: str, status: int, seconds: float):
+    """Records the end-to-end latency of one HTTP request."""
+    if PROMETHEUS_AVAILABLE:
+        HTTP_REQUEST_DURATION.labels(method, endpoint, str(status)).observe(seconds)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Renders all metrics in the Prometheus text format. When PROMETHEUS_MULTIPROC_DIR
+    is set (multi-worker deployments), samples from every worker process are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+# --- OpenTelemetry export (optional) ---
+def _configure_tracing():
+    """Exports every stage as an OpenTelemetry span when an OTLP endpoint is configured."""
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        logger.warning("OTEL_EXPORTER_OTLP_ENDPOINT is set but the OpenTelemetry SDK/OTLP exporter is not installed.")
+        return
+
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    tracer = trace.get_tracer(__name__)
+
+    @contextmanager
+    def stage_span(stage: str) -> Iterator[None]:
+        with tracer.start_as_current_span(stage):
+            yield
+
+    add_span_factory(stage_span)
+    logger.info(f"OpenTelemetry tracing enabled, exporting to {OTEL_EXPORTER_OTLP_ENDPOINT}")
+
+if OTEL_EXPORTER_OTLP_ENDPOINT:
+    _configure_tracing()
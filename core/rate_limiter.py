@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from core import deadline
+from core.config import LLM_TIMEOUT_SECONDS
+from core.metrics import observe_llm_call
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+def estimate_tokens(prompt: Any) -> int:
+    """Counts the tokens of a prompt (string, prompt value or list of messages)."""
+    if hasattr(prompt, "to_string"):
+        text = prompt.to_string()
+    elif isinstance(prompt, (list, tuple)):
+        text = "\n".join(str(getattr(message, "content", message)) for message in prompt)
+    else:
+        text = str(prompt)
+    return max(1, count_tokens(text))
+
+class AsyncTokenBucket:
+    """
+    An asyncio token bucket. `capacity` tokens are available at once and the
+    bucket refills continuously at `refill_per_second`. Callers that cannot be
+    served immediately wait in FIFO order instead of failing.
+    """
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # asyncio.Lock is bound to the loop it is first used on; recreate it if
+        # the bucket is shared with a different loop (e.g. in tests).
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+
+    @property
+    def available(self) -> float:
+        """Tokens that could be taken right now (negative while in debt)."""
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Waits until `amount` tokens are available and takes them. Returns the seconds spent waiting."""
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        async with self._get_lock():
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self.refill_per_second
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def consume(self, amount: float):
+        """Charges tokens after the fact without waiting; the bucket may go into debt."""
+        self._refill()
+        self._tokens -= float(amount)
+
+class RateLimitedChatModel:
+    """
+    Wraps a LangChain chat model so every `ainvoke` goes through request-per-minute
+    and token-per-minute buckets. Requests over the limit are queued rather than
+    sent to the provider to fail with 429s. All other attributes are delegated
+    to the wrapped model, which keeps its own persistent client connections.
+    """
+    def __init__(self, model, requests_per_minute: int, tokens_per_minute: int):
+        self.model = model
+        self.request_bucket = AsyncTokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.token_bucket = AsyncTokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        """
+        Asynchronously invokes the wrapped model once both rate limits allow it.
+        Queueing and the call itself are bounded by the request deadline, and the
+        call by LLM_TIMEOUT_SECONDS; on timeout the in-flight request is cancelled.
+        """
+        prompt_tokens = estimate_tokens(input)
+        # Queueing in the rate limiter is bounded only by the request deadline, if there is one.
+        waited = await asyncio.wait_for(self.request_bucket.acquire(1), deadline.timeout_for(0, "the LLM call") or None)
+        waited += await asyncio.wait_for(self.token_bucket.acquire(prompt_tokens),
+                                         deadline.timeout_for(0, "the LLM call") or None)
+        if waited > 0:
+            logger.info(f"LLM call queued for {waited:.2f}s by the client-side rate limiter.")
+
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.model.ainvoke(input, config=config, **kwargs),
+                timeout=deadline.timeout_for(LLM_TIMEOUT_SECONDS, "the LLM call") or None,
+            )
+        except BaseException:
+            observe_llm_call(time.perf_counter() - started, "error", waited, prompt_tokens)
+            raise
+
+        # Reconcile the estimate with the provider's usage report, if any.
+        usage = getattr(response, "usage_metadata", None) or {}
+        input_tokens = usage.get("input_tokens", prompt_tokens)
+        output_tokens = usage.get("output_tokens", 0)
+        if usage:
+            self.token_bucket.consume(input_tokens + output_tokens - prompt_tokens)
+        observe_llm_call(time.perf_counter() - started, "ok", waited, input_tokens, output_tokens)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
@@ -0,0 +1,236 @@
+"""
+Shared task and cache state for all worker processes.
+
+`StateStore` is a small namespaced key/value interface for JSON-serialisable
+values with optional TTLs. `SQLiteStateStore` (the default) keeps everything
+in one SQLite file in WAL mode, so every uvicorn worker on a host reads and
+writes the same task statuses and caches. SQLite's file locking serialises
+writers, and a busy timeout makes them wait instead of failing. Entries are
+dropped when their TTL expires. When the store grows past STATE_MAX_BYTES,
+the least recently used entries are evicted.
+
+The backend is chosen by STATE_STORE_URL: "sqlite:///path/to/state.db",
+"memory://" (per-process, for tests and single-worker runs), or a
+"package.module:ClassName" import path for a custom `StateStore`.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from core.config import STATE_STORE_URL, STATE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Namespaces used across the app.
+TASKS = "tasks"
+RESULTS = "results"
+TABLE_SELECTION = "table_selection"
+
+class StateStore(ABC):
+    """Namespaced key/value store for JSON-serialisable values, shared across worker processes."""
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Returns the stored value, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Stores `value`, replacing any previous one. It expires after `ttl` seconds, if given."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str):
+        """Removes an entry if present."""
+
+    def close(self):
+        """Releases any resources held by the store."""
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set, namespace, key, value, ttl)
+
+class MemoryStateStore(StateStore):
+    """Per-process store with the same TTL and size-bounded LRU semantics as the SQLite store."""
+    def __init__(self, max_bytes: int = STATE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, Optional[float]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                self._remove((namespace, key))
+                return None
+            self._entries.move_to_end((namespace, key))
+            return json.loads(value)
+
+    def set(self, namespace, key, value, ttl=None):
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (encoded, time.time() + ttl if ttl else None)
+            self._size += len(encoded)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._remove((namespace, key))
+
+    def _remove(self, entry_key):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+class SQLiteStateStore(StateStore):
+    """SQLite-backed store (WAL mode) that every worker process on a host can open concurrently."""
+    # Reads refresh an entry's LRU timestamp at most this often, to keep reads from becoming writes.
+    TOUCH_INTERVAL_SECONDS = 60
+    # Expired and over-budget entries are evicted once every this many writes (per process).
+    EVICTION_INTERVAL = 32
+
+    def __init__(self, path: str, max_bytes: int = STATE_MAX_BYTES, busy_timeout: float = 10.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " size INTEGER NOT NULL, expires_at REAL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        # Take the write lock up front so concurrent writers queue on the busy timeout.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, namespace, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at, accessed_at = row
+        if expires_at is not None and expires_at < now:
+            self.delete(namespace, key)
+            return None
+        if now - accessed_at > self.TOUCH_INTERVAL_SECONDS:
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+                )
+        return json.loads(value)
+
+    def set(self, namespace, key, value, ttl=None):
+        encoded = json.dumps(value)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, encoded, len(encoded), now + ttl if ttl else None, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                self._evict(conn, now)
+
+    def delete(self, namespace, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def evict(self):
+        """Drops expired entries, then least recently used ones until the store fits in `max_bytes`."""
+        with self._transaction() as conn:
+            self._evict(conn, time.time())
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)).rowcount
+        over_budget = conn.execute(
+            "DELETE FROM entries WHERE rowid IN ("
+            " SELECT rowid FROM (SELECT rowid, SUM(size) OVER (ORDER BY accessed_at DESC, rowid DESC) AS total"
+            " FROM entries) WHERE total > ?)",
+            (self.max_bytes,),
+        ).rowcount
+        if expired or over_budget:
+            logger.info(f"State store eviction: {expired} expired, {over_budget} least recently used entries removed.")
+
+    def stats(self) -> Dict[str, Any]:
+        count, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def create_state_store(url: str = STATE_STORE_URL) -> StateStore:
+    """Builds the state store described by `url` (see module docstring)."""
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    if url == "memory://":
+        return MemoryStateStore()
+    module_name, _, attr_name = url.partition(":")
+    if not attr_name:
+        raise ValueError(f"Unsupported STATE_STORE_URL '{url}'.")
+    return getattr(importlib.import_module(module_name), attr_name)()
+
+_state_store: Optional[StateStore] = None
+_state_store_lock = threading.Lock()
+
+def get_state_store() -> StateStore:
+    """Returns the process-wide state store, creating it on first use."""
+    global _state_store
+    if _state_store is None:
+        with _state_store_lock:
+            if _state_store is None:
+                _state_store = create_state_store()
+                logger.info(f"State store: {type(_state_store).__name__} ({STATE_STORE_URL})")
+    return _state_store
+
+def set_state_store(store: Optional[StateStore]):
+    """Replaces the process-wide state store, e.g. with a MemoryStateStore in tests."""
+    global _state_store
+    with _state_store_lock:
+        _state_store = store
@@ -0,0 +1,65 @@
+import logging
+import time
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar
+from typing import Callable, ContextManager, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Stage timings recorded in the current request context, if someone is collecting them.
+_collected_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("collected_timings", default=None)
+# Name of the workflow currently executing, used to label stage measurements.
+current_workflow: ContextVar[str] = ContextVar("current_workflow", default="unknown")
+
+# Called as listener(workflow, stage, seconds, failed) after every stage.
+_stage_listeners: List[Callable[[str, str, float, bool], None]] = []
+# Called as factory(stage) to get a context manager (e.g. a tracing span) wrapped around every stage.
+_span_factories: List[Callable[[str], ContextManager]] = []
+
+def add_stage_listener(listener: Callable[[str, str, float, bool], None]):
+    """Registers a callback that receives the duration of every completed stage."""
+    _stage_listeners.append(listener)
+
+def add_span_factory(factory: Callable[[str], ContextManager]):
+    """Registers a factory whose context manager is entered around every stage."""
+    _span_factories.append(factory)
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    Times a workflow stage (e.g. "scrape.fetch", "codegen.llm"). The duration is
+    logged at debug level, appended to the active `collect_stage_timings()` list
+    and passed to every registered stage listener.
+    """
+    failed = False
+    started = time.perf_counter()
+    try:
+        with ExitStack() as spans:
+            for factory in _span_factories:
+                spans.enter_context(factory(stage))
+            yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        logger.debug(f"Stage '{stage}' took {elapsed:.3f}s")
+        timings = _collected_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+        workflow = current_workflow.get()
+        for listener in _stage_listeners:
+            try:
+                listener(workflow, stage, elapsed, failed)
+            except Exception as e:
+                logger.debug(f"Stage listener failed: {e}")
+
+@contextmanager
+def collect_stage_timings() -> Iterator[List[Tuple[str, float]]]:
+    """Collects `(stage, seconds)` pairs for every `stage_timer` run inside this context (including child tasks)."""
+    timings: List[Tuple[str, float]] = []
+    token = _collected_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _collected_timings.reset(token)
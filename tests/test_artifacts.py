@@ -0,0 +1,74 @@
+import asyncio
+import base64
+import os
+import time
+
+from core import artifacts
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+DATA_URI = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode("ascii")
+
+def test_charts_and_large_tables_become_references_and_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.setattr(artifacts, "ARTIFACT_TABLE_MIN_BYTES", 100)
+    table = [{"title": f"Film {i}", "gross": i * 1.5} for i in range(20)]
+    result = {"answer": "Titanic", "chart": DATA_URI, "same_chart": DATA_URI, "table": table, "small": [[1, 2], [3, 4]]}
+
+    externalized = artifacts.externalize_artifacts(result)
+
+    assert externalized["answer"] == "Titanic"
+    assert externalized["chart"].startswith("/api/artifacts/") and externalized["chart"].endswith(".png")
+    assert externalized["same_chart"] == externalized["chart"]
+    assert externalized["table"].endswith(".json")
+    assert externalized["small"] == [[1, 2], [3, 4]]
+    assert len(list(tmp_path.rglob("*.*"))) == 2
+    assert artifacts.inline_artifacts(externalized) == result
+
+def test_artifact_ids_are_validated():
+    assert artifacts.artifact_path("../../etc/passwd") is None
+    assert artifacts.artifact_path("a" * 64 + ".png").endswith("a" * 64 + ".png")
+
+def test_sweep_deletes_expired_then_oldest_artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    now = time.time()
+    ids = [artifacts.save_artifact(bytes([i]) * 100, "image/png") for i in range(4)]
+    for age, artifact_id in zip((30, 20, 10, 0), ids):
+        os.utime(artifacts.artifact_path(artifact_id), (now - age * 86400, now - age * 86400))
+    # Storing an expired artifact again renews it.
+    artifacts.save_artifact(bytes([0]) * 100, "image/png")
+
+    assert artifacts.sweep_artifacts(max_age_seconds=15 * 86400, max_bytes=200) == 2
+    assert [os.path.exists(artifacts.artifact_path(i)) for i in ids] == [True, False, False, True]
+
+def test_artifacts_are_served_sandboxed(tmp_path, monkeypatch):
+    import httpx
+    from app.main import app
+
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    svg_id = artifacts.save_artifact(b"<svg xmlns='http://www.w3.org/2000/svg'><script>alert(1)</script></svg>",
+                                     "image/svg+xml")
+    png_id = artifacts.save_artifact(PNG_BYTES, "image/png")
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await client.get(f"/api/artifacts/{artifact_id}") for artifact_id in (svg_id, png_id)]
+
+    svg, png = asyncio.run(fetch())
+    assert svg.status_code == 200 and svg.headers["content-disposition"].startswith("attachment")
+    assert "sandbox" in svg.headers["content-security-policy"]
+    assert "sandbox" in png.headers["content-security-policy"] and "content-disposition" not in png.headers
+
+def test_swept_artifact_is_not_found_even_when_revalidated(tmp_path, monkeypatch):
+    import httpx
+    from app.main import app
+
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    png_id = artifacts.save_artifact(PNG_BYTES, "image/png")
+    os.remove(artifacts.artifact_path(png_id))
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            etag = f'"{png_id.split(".")[0]}"'
+            return await client.get(f"/api/artifacts/{png_id}", headers={"If-None-Match": etag})
+
+    assert asyncio.run(fetch()).status_code == 404
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import httpx
+
+from core.state import TASKS, MemoryStateStore, get_state_store, set_state_store
+
+def _stub_workflows(monkeypatch, calls, cancelled):
+    from app import api
+
+    async def execute_workflow(workflow_type, input_data, use_cache=False):
+        task_description = input_data["task_description"]
+        calls.append(task_description)
+        if "slow" in task_description:
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(task_description)
+                raise
+        if "broken" in task_description:
+            raise RuntimeError("workflow failed")
+        return {"answer": task_description}
+
+    monkeypatch.setattr(api.orchestrator, "execute_workflow", execute_workflow)
+
+def _multipart(*questions):
+    body = b"".join(
+        b'--X\r\nContent-Disposition: form-data; name="questions"; filename="q%d.txt"\r\n' % index
+        + b"Content-Type: text/plain\r\n\r\n" + question.encode() + b"\r\n"
+        for index, question in enumerate(questions)
+    )
+    return body + b"--X--\r\n"
+
+def test_batch_streams_id_map_results_and_summary(monkeypatch):
+    from app.main import app
+
+    calls, cancelled = [], []
+    _stub_workflows(monkeypatch, calls, cancelled)
+    set_state_store(MemoryStateStore())
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/api/batch", content=_multipart("Scrape A", "Scrape A", "Query B with duckdb", "broken C"),
+                headers={"content-type": "multipart/form-data; boundary=X"},
+            )
+            lines = [json.loads(line) for line in response.text.splitlines()]
+            records = [await get_state_store().aget(TASKS, task["task_id"]) for task in lines[0]["tasks"]]
+            return response, lines, records
+
+    try:
+        response, lines, records = asyncio.run(run())
+    finally:
+        set_state_store(None)
+
+    header, results, summary = lines[0], lines[1:-1], lines[-1]
+    assert header["status"] == "accepted" and header["batch_id"] == response.headers["x-batch-id"]
+    assert [task["index"] for task in header["tasks"]] == [0, 1, 2, 3]
+    assert header["tasks"][2]["workflow_type"] == "database_analysis"
+    # Identical questions run once but are answered for every copy.
+    assert header["distinct_tasks"] == 3 and sorted(calls) == ["Query B with duckdb", "Scrape A", "broken C"]
+    task_ids = {task["index"]: task["task_id"] for task in header["tasks"]}
+    assert sorted(line["index"] for line in results) == [0, 1, 2, 3]
+    assert all(line["task_id"] == task_ids[line["index"]] for line in results)
+    by_index = {line["index"]: line for line in results}
+    assert by_index[0]["result"] == by_index[1]["result"] == {"answer": "Scrape A"}
+    assert by_index[3]["status"] == "failed" and by_index[3]["error"] == "workflow failed"
+    assert summary == {"batch_id": header["batch_id"], "status": "finished", "tasks": 4,
+                       "distinct_tasks": 3, "failed": 1}
+    assert [record["status"] for record in records] == ["completed", "completed", "completed", "failed"]
+
+def test_batch_disconnect_cancels_unfinished_tasks(monkeypatch):
+    from app.main import app
+
+    calls, cancelled = [], []
+    _stub_workflows(monkeypatch, calls, cancelled)
+    set_state_store(MemoryStateStore())
+    body = _multipart("Scrape A", "slow B")
+
+    async def run():
+        first_result = asyncio.Event()
+        sent = []
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/api/batch", "raw_path": b"/api/batch", "root_path": "",
+            "query_string": b"", "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+            "headers": [(b"content-type", b"multipart/form-data; boundary=X"),
+                        (b"content-length", str(len(body)).encode())],
+        }
+        messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+
+        async def receive():
+            message = next(messages, None)
+            if message is not None:
+                return message
+            await first_result.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            chunks = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+            if chunks.count(b"\n") >= 2:
+                first_result.set()
+
+        await asyncio.wait_for(app(scope, receive, send), timeout=10)
+        lines = [json.loads(line) for line in
+                 b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").splitlines()]
+        # Cancelled tasks record their status as they unwind, just after the response ends.
+        for _ in range(100):
+            records = [await get_state_store().aget(TASKS, task["task_id"]) for task in lines[0]["tasks"]]
+            if records[1]["status"] == "cancelled":
+                break
+            await asyncio.sleep(0.01)
+        return lines, records
+
+    try:
+        lines, records = asyncio.run(run())
+    finally:
+        set_state_store(None)
+
+    assert lines[0]["status"] == "accepted" and len(lines[0]["tasks"]) == 2
+    assert [line["index"] for line in lines[1:]] == [0]
+    assert cancelled == ["slow B"]
+    assert [record["status"] for record in records] == ["completed", "cancelled"]
@@ -0,0 +1,61 @@
+import asyncio
+import io
+
+import pandas as pd
+import pytest
+
+from benchmarks.local_site import serve_directory
+from utils import browser_pool
+from utils.browser_pool import PLAYWRIGHT_AVAILABLE, BrowserContextPool
+
+@pytest.mark.skipif(not PLAYWRIGHT_AVAILABLE, reason="playwright is not installed")
+def test_pool_renders_js_built_tables_and_recycles_contexts():
+    async def render_three_times(url):
+        pool = BrowserContextPool(size=1, max_uses=2, render_timeout=10)
+        try:
+            await pool.start()
+        except Exception as e:
+            pytest.skip(f"no headless browser available: {e}")
+        try:
+            pages = [await pool.render(url) for _ in range(3)]
+        finally:
+            await pool.close()
+        return pages, pool.recycled
+
+    with serve_directory() as base_url:
+        pages, recycled = asyncio.run(render_three_times(f"{base_url}/js_rendered_films.html"))
+
+    tables = pd.read_html(io.StringIO(pages[-1]))
+    assert tables[0]["Title"].tolist()[:2] == ["Avatar", "Avengers: Endgame"]
+    assert recycled == 1
+
+def test_failed_launch_is_retried_after_a_backoff(monkeypatch):
+    launches = []
+
+    async def start(self):
+        launches.append(1)
+        if len(launches) == 1:
+            raise RuntimeError("browser crashed during launch")
+        self._browser = object()
+
+    async def close(self):
+        pass
+
+    monkeypatch.setattr(browser_pool, "PLAYWRIGHT_AVAILABLE", True)
+    monkeypatch.setattr(browser_pool, "BROWSER_LAUNCH_RETRY_SECONDS", 0.2)
+    monkeypatch.setattr(BrowserContextPool, "start", start)
+    monkeypatch.setattr(BrowserContextPool, "close", close)
+    monkeypatch.setattr(browser_pool, "_shared_pool", None)
+    monkeypatch.setattr(browser_pool, "_start_lock", None)
+    monkeypatch.setattr(browser_pool, "_launch_failures", 0)
+    monkeypatch.setattr(browser_pool, "_retry_at", 0.0)
+
+    async def run():
+        first = await browser_pool.get_browser_pool()
+        during_backoff = await browser_pool.get_browser_pool()
+        await asyncio.sleep(0.25)
+        return first, during_backoff, await browser_pool.get_browser_pool()
+
+    first, during_backoff, retried = asyncio.run(run())
+    assert first is None and during_backoff is None
+    assert isinstance(retried, BrowserContextPool) and len(launches) == 2
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from app.api import ClientDisconnected, _run_while_connected
+from core.deadline import DeadlineExceeded, request_deadline, timeout_for
+from utils.fetching import fetch_tables
+from utils.sandbox import run_script
+
+def test_stage_timeouts_are_capped_by_the_request_deadline():
+    assert timeout_for(20) == 20
+    with request_deadline(5):
+        assert 4 < timeout_for(20) <= 5
+        assert timeout_for(2) == 2
+        # A nested deadline can only shorten the enclosing one.
+        with request_deadline(60):
+            assert timeout_for(20) <= 5
+    with request_deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(20)
+
+def test_sandbox_run_stops_at_the_request_deadline():
+    async def run():
+        with request_deadline(1.5):
+            return await run_script("while True:\n    pass\n")
+
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    assert result.status == "timeout"
+    assert result.limits.timeout_seconds <= 1.5
+    assert time.perf_counter() - started < 10
+
+def test_deadline_expiring_inside_a_fetch_is_a_deadline_error():
+    # A server that accepts connections but never answers.
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    accepted = []
+    threading.Thread(target=lambda: accepted.append(server.accept()), daemon=True).start()
+
+    async def fetch():
+        with request_deadline(0.5):
+            return await fetch_tables([f"http://127.0.0.1:{server.getsockname()[1]}/table"], timeout=20)
+
+    started = time.perf_counter()
+    try:
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(fetch())
+    finally:
+        server.close()
+    # DeadlineExceeded is a TimeoutError, which the API answers with 408.
+    assert issubclass(DeadlineExceeded, asyncio.TimeoutError)
+    assert time.perf_counter() - started < 5
+
+class _DisconnectingRequest:
+    def __init__(self, after: float):
+        self.disconnect_at = time.monotonic() + after
+
+    async def is_disconnected(self) -> bool:
+        return time.monotonic() >= self.disconnect_at
+
+def test_client_disconnect_kills_the_sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.api.DISCONNECT_POLL_SECONDS", 0.05)
+    pid_file = tmp_path / "pid"
+    code = f"import os, time\nopen({str(pid_file)!r}, 'w').write(str(os.getpid()))\ntime.sleep(60)\n"
+
+    async def run():
+        with pytest.raises(ClientDisconnected):
+            await _run_while_connected(_DisconnectingRequest(after=3), run_script(code), timeout=60)
+
+    asyncio.run(run())
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("The sandboxed process survived the client disconnect.")
+
+def test_disconnect_through_the_app_cancels_the_workflow(monkeypatch):
+    from app import api
+    from app.main import app
+    from core.state import MemoryStateStore, set_state_store
+
+    set_state_store(MemoryStateStore())
+    monkeypatch.setattr("app.api.DISCONNECT_POLL_SECONDS", 0.05)
+    outcome = {}
+
+    async def run():
+        started = asyncio.Event()
+
+        async def slow_workflow(workflow_type, input_data, use_cache=False):
+            started.set()
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                outcome["cancelled"] = True
+                raise
+
+        monkeypatch.setattr(api.orchestrator, "execute_workflow", slow_workflow)
+        body = (b'--X\r\nContent-Disposition: form-data; name="questions_txt"; filename="q.txt"\r\n'
+                b"Content-Type: text/plain\r\n\r\nScrape https://example.com/table\r\n--X--\r\n")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/api/", "raw_path": b"/api/", "root_path": "", "query_string": b"",
+            "headers": [(b"content-type", b"multipart/form-data; boundary=X"),
+                        (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+        }
+        messages = iter([{"type": "http.request", "body": body, "more_body": False}])
+        sent = []
+
+        async def receive():
+            message = next(messages, None)
+            if message is not None:
+                return message
+            # Starlette polls for a disconnect with an already-cancelled scope: answer without awaiting.
+            if started.is_set():
+                return {"type": "http.disconnect"}
+            await started.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(app(scope, receive, send), timeout=10)
+        return sent
+
+    try:
+        sent = asyncio.run(run())
+    finally:
+        set_state_store(None)
+    assert outcome.get("cancelled")
+    assert sent[0]["status"] == 499
@@ -0,0 +1,33 @@
+import asyncio
+
+from benchmarks.local_site import serve_directory
+from utils.fetching import extract_urls, fetch_tables
+from workflows.web_scraping import combine_matching_tables
+
+def _page(rows, next_href=None, columns=("Rank", "Title", "Gross")):
+    header = "".join(f"<th>{c}</th>" for c in columns)
+    body = "".join("<tr>" + "".join(f"<td>{v}</td>" for v in row) + "</tr>" for row in rows)
+    link = f'<a rel="next" href="{next_href}">Next</a>' if next_href else ""
+    return f"<html><body><table><tr>{header}</tr>{body}</table>{link}</body></html>"
+
+def test_extract_urls_keeps_order_and_balanced_parentheses():
+    text = "Compare https://example.org/a, https://en.wikipedia.org/wiki/Titanic_(1997_film) and (https://example.org/a)."
+    assert extract_urls(text) == ["https://example.org/a", "https://en.wikipedia.org/wiki/Titanic_(1997_film)"]
+
+def test_pagination_is_followed_and_matching_tables_are_combined(tmp_path):
+    (tmp_path / "films1.html").write_text(_page([(1, "Avatar", 2.9)], next_href="films2.html"))
+    (tmp_path / "films2.html").write_text(_page([(2, "Endgame", 2.7)], next_href="films3.html"))
+    (tmp_path / "films3.html").write_text(_page([(3, "Titanic", 2.2)]))
+    (tmp_path / "other.html").write_text(_page([("x", "y")], columns=("Year", "Event")))
+
+    with serve_directory(str(tmp_path)) as base_url:
+        pages = asyncio.run(fetch_tables([f"{base_url}/films1.html", f"{base_url}/other.html"]))
+
+    assert [page.url.rsplit("/", 1)[1] for page in pages] == ["films1.html", "other.html", "films2.html", "films3.html"]
+    tables = [table for page in pages for table in page.tables]
+    sources = [page.url for page in pages for _ in page.tables]
+    combined = combine_matching_tables(tables, sources, 0)
+
+    assert combined["Title"].tolist() == ["Avatar", "Endgame", "Titanic"]
+    assert combined["source"].str.endswith(("films1.html", "films2.html", "films3.html")).all()
+    assert "Event" not in combined.columns
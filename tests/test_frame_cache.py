@@ -0,0 +1,95 @@
+import asyncio
+
+import pandas as pd
+
+from core.frame_cache import DataFrameCache, frame_cache_key, load_once
+
+def _frame(rows):
+    return pd.DataFrame({"rank": range(rows), "title": [f"film {i}" for i in range(rows)]})
+
+def test_frame_cache_spills_least_recently_used_and_reloads(tmp_path):
+    df = _frame(1000)
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    cache = DataFrameCache(max_bytes=int(size * 1.5), spill_dir=str(tmp_path), spill_max_bytes=10**9, ttl=60)
+    first = frame_cache_key(["https://example.com/a"], "1")
+    second = frame_cache_key(["https://example.com/b"], "1")
+
+    cache.put(first, df, {"df_columns": "rank:i, title:s"})
+    cache.put(second, _frame(1000), {})
+
+    assert cache.stats()["in_memory"] == 1
+    assert cache.memory_bytes <= cache.max_bytes
+    reloaded = cache.get(first)
+    pd.testing.assert_frame_equal(reloaded.df, df)
+    assert reloaded.summary == {"df_columns": "rank:i, title:s"}
+    # Reloading the first frame spilled the second one to stay within budget.
+    assert cache.stats()["in_memory"] == 1
+
+def test_frame_cache_key_depends_on_cleaning_version(tmp_path):
+    cache = DataFrameCache(max_bytes=10**9, spill_dir=str(tmp_path), spill_max_bytes=10**9, ttl=60)
+    cache.put(frame_cache_key(["https://example.com/a"], "1"), _frame(10), {})
+
+    assert cache.get(frame_cache_key(["https://example.com/a"], "2")) is None
+    assert cache.get(frame_cache_key(["https://example.com/a"], "1")) is not None
+
+def test_concurrent_loads_of_one_source_run_once():
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return _frame(10)
+
+    async def run():
+        return await asyncio.gather(*(load_once("https://example.com/a", load) for _ in range(5)))
+
+    frames = asyncio.run(run())
+    assert len(loads) == 1
+    assert all(frame is frames[0] for frame in frames)
+
+def test_questions_on_one_page_share_the_fetch_but_select_their_own_table(monkeypatch, tmp_path):
+    from core.state import MemoryStateStore, set_state_store
+    from utils.fetching import FetchedPage
+    from workflows import web_scraping
+
+    films = pd.DataFrame({"Title": ["Avatar", "Titanic"], "Gross": ["$2.9", "$2.2"]})
+    courts = pd.DataFrame({"Court": ["Delhi", "Madras"], "Cases": ["10", "20"]})
+    cache = DataFrameCache(max_bytes=10**9, spill_dir=str(tmp_path), spill_max_bytes=10**9, ttl=60)
+    fetches = []
+
+    async def fetch_tables(urls):
+        fetches.append(urls)
+        await asyncio.sleep(0.05)
+        return [FetchedPage(url=urls[0], order=0, tables=[films.copy(), courts.copy()])]
+
+    async def select_by_keyword(self, tables, task_description, keywords):
+        return 1 if "court" in keywords else 0
+
+    async def answer_with_columns(self, input_data):
+        return sorted(input_data["data"].columns)
+
+    monkeypatch.setattr(web_scraping, "FRAME_CACHE_ENABLED", True)
+    monkeypatch.setattr(web_scraping, "get_frame_cache", lambda: cache)
+    monkeypatch.setattr(web_scraping, "fetch_tables", fetch_tables)
+    monkeypatch.setattr(web_scraping.ScrapeStep, "_select_best_table_with_llm", select_by_keyword)
+    monkeypatch.setattr(web_scraping.CodeGeneratingAnswerStep, "run", answer_with_columns)
+    set_state_store(MemoryStateStore())
+    workflow = web_scraping.MultiStepWebScrapingWorkflow()
+
+    def ask(question):
+        return workflow.execute({"task_description": f"{question} https://example.com/tables"})
+
+    async def run():
+        films_answer, courts_answer = await asyncio.gather(ask("Which film grossed most?"),
+                                                           ask("Which court had most cases?"))
+        return films_answer, courts_answer, await ask("Which court had most cases?")
+
+    try:
+        films_answer, courts_answer, follow_up = asyncio.run(run())
+    finally:
+        set_state_store(None)
+    assert films_answer == ["Gross", "Title"]
+    assert courts_answer == follow_up == ["Cases", "Court"]
+    # The concurrent questions shared one fetch; the follow-up was served from the frame cache.
+    assert len(fetches) == 1
+    assert cache.stats()["entries"] == 2
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from utils.profiling import load_profile_summary, profile_dir_for, profiled, sweep_profiles
+from utils.sandbox import SandboxLimits, run_dataframe_code, run_script
+
+LIMITS = SandboxLimits(memory_mb=1024, cpu_seconds=10, timeout_seconds=10, max_output_bytes=10_000, threads=1)
+
+def test_sandbox_runs_write_profiles(monkeypatch, tmp_path):
+    monkeypatch.setattr("utils.profiling.PROFILE_ARTIFACT_DIR", str(tmp_path))
+    profile_dir = profile_dir_for("task-1")
+    df = pd.DataFrame({"gross": [2.5, 2.0, 1.5]})
+
+    async def run_both():
+        frame = await run_dataframe_code("final_answer = float(df['gross'].sum())", df, LIMITS, profile_dir=profile_dir)
+        script = await run_script("data = [i * i for i in range(100_000)]\nprint(sum(data))", LIMITS,
+                                  profile_dir=profile_dir, profile_label="script")
+        return frame, script
+
+    frame, script = asyncio.run(run_both())
+    assert frame.ok and frame.value == 6.0
+    assert script.ok
+
+    summary = load_profile_summary("task-1")
+    assert [run["label"] for run in summary["runs"]] == ["generated_code", "script"]
+    for run in summary["runs"]:
+        assert run["peak_memory_bytes"] > 0
+        assert run["top_functions"] and {"function", "calls", "cumulative_seconds"} <= set(run["top_functions"][0])
+        assert os.path.exists(os.path.join(profile_dir, f"{run['label']}.prof"))
+    # Only the generated code is profiled, not the runner's imports and unpickling of `df`.
+    frame_run = summary["runs"][0]
+    assert not any("_find_and_load" in row["function"] for row in frame_run["top_functions"])
+    assert frame_run["peak_memory_bytes"] < 1_000_000
+    # The list comprehension allocates far more than the one-line DataFrame code.
+    assert summary["runs"][1]["peak_memory_bytes"] > 1_000_000
+
+def test_profile_lookup_rejects_malformed_task_ids(monkeypatch, tmp_path):
+    monkeypatch.setattr("utils.profiling.PROFILE_ARTIFACT_DIR", str(tmp_path))
+    assert load_profile_summary("never-profiled") is None
+    for task_id in ("../etc", "a/b", "", "task id"):
+        with pytest.raises(ValueError):
+            load_profile_summary(task_id)
+
+def test_sweep_deletes_old_task_profiles(monkeypatch, tmp_path):
+    monkeypatch.setattr("utils.profiling.PROFILE_ARTIFACT_DIR", str(tmp_path))
+    for task_id, age in (("old-task", 10 * 86400), ("new-task", 0)):
+        with profiled(profile_dir_for(task_id), "generated_code"):
+            sum(range(1000))
+        stamp = time.time() - age
+        for path in [tmp_path / task_id, *(tmp_path / task_id).iterdir()]:
+            os.utime(path, (stamp, stamp))
+
+    assert sweep_profiles(max_age_seconds=7 * 86400) == 1
+    assert load_profile_summary("old-task") is None
+    assert load_profile_summary("new-task")["runs"]
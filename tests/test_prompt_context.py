@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from utils.prompt_context import build_dataframe_context, render_schema
+
+def test_schema_groups_flattened_header_prefixes():
+    df = pd.DataFrame({
+        "Rank": [1, 2],
+        "Box_office_Gross": [2.9e9, 2.7e9],
+        "Box_office_Peak": [1, 1],
+        "Title": ["Avatar", "Avengers: Endgame"],
+    })
+    schema = render_schema(df)
+    assert "shape: 2 rows x 4 columns" in schema
+    assert "Box_office_{Gross:f,Peak:i}" in schema
+    assert "Rank:i" in schema and "Title:s" in schema
+
+def test_context_fits_token_budget_for_wide_tables():
+    wide = pd.DataFrame(np.random.rand(20, 300), columns=[f"Group_{i}_long_column_name" for i in range(300)])
+    context = build_dataframe_context(wide, token_budget=400)
+    report = context["token_report"]
+    assert report["compact_tokens"] <= 400
+    assert report["compact_tokens"] < report["baseline_tokens"]
+    assert "more columns" in context["df_columns"]
+
+def test_long_cells_are_truncated():
+    df = pd.DataFrame({"Notes": ["word " * 100]})
+    context = build_dataframe_context(df)
+    assert "…" in context["df_head"]
+    assert len(context["df_head"]) < 100
@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+from core.rate_limiter import AsyncTokenBucket, RateLimitedChatModel, estimate_tokens
+
+class _EchoModel:
+    """A minimal stand-in for a chat model that records how many calls it received."""
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        return input
+
+def test_token_bucket_queues_instead_of_failing():
+    """Requests beyond the burst capacity wait for the bucket to refill."""
+    bucket = AsyncTokenBucket(capacity=2, refill_per_second=20)
+
+    async def take_four():
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire(1) for _ in range(4)))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(take_four())
+    # Two tokens are available immediately; the other two need ~0.05s each to refill.
+    assert elapsed >= 0.09
+
+def test_token_bucket_consume_can_go_into_debt():
+    bucket = AsyncTokenBucket(capacity=10, refill_per_second=1)
+    bucket.consume(15)
+    assert bucket.available < 0
+
+def test_rate_limited_model_delegates_calls():
+    model = _EchoModel()
+    limited = RateLimitedChatModel(model, requests_per_minute=60, tokens_per_minute=100_000)
+    result = asyncio.run(limited.ainvoke("hello"))
+    assert result == "hello"
+    assert model.calls == 1
+    assert limited.calls == 1  # attribute access falls through to the wrapped model
+
+def test_estimate_tokens_handles_message_lists():
+    class Message:
+        content = "x" * 40
+    assert estimate_tokens([Message(), Message()]) >= 20
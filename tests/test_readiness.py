@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+
+from core.base import AdvancedWorkflowOrchestrator
+
+def _get_ready():
+    from app.main import app
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/ready")
+
+    return asyncio.run(run())
+
+def test_ready_waits_for_warm_up(monkeypatch):
+    monkeypatch.setattr("app.main.orchestrator", AdvancedWorkflowOrchestrator())
+    response = _get_ready()
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+
+def test_ready_without_warm_up_loads_workflows_lazily(monkeypatch):
+    monkeypatch.setattr("app.main.orchestrator", AdvancedWorkflowOrchestrator())
+    monkeypatch.setattr("app.main.WARM_UP_ON_STARTUP", False)
+    response = _get_ready()
+    assert response.status_code == 200
+    assert response.json()["warm_up"] == "disabled"
+    assert response.json()["workflows"]["pending"]
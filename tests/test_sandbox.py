@@ -0,0 +1,48 @@
+import asyncio
+
+import pandas as pd
+
+from utils.sandbox import SandboxLimits, run_dataframe_code, run_script
+
+LIMITS = SandboxLimits(memory_mb=1024, cpu_seconds=5, timeout_seconds=5, max_output_bytes=10_000, threads=1)
+
+def test_script_output_is_captured():
+    result = asyncio.run(run_script('import json; print(json.dumps({"answer": 42}))', LIMITS))
+    assert result.ok
+    assert result.stdout.strip() == '{"answer": 42}'
+
+def test_limit_violations_are_classified():
+    async def run_all():
+        return await asyncio.gather(
+            run_script("import numpy as np; a = np.ones(400_000_000)", LIMITS),
+            run_script("while True: print('x' * 1000)", LIMITS),
+            run_script("import time; time.sleep(30)", SandboxLimits(timeout_seconds=1)),
+            run_script("raise KeyError('missing')", LIMITS),
+        )
+
+    memory, output, timeout, error = asyncio.run(run_all())
+    assert memory.status == "memory_limit"
+    assert output.status == "output_limit" and len(output.stdout) == LIMITS.max_output_bytes
+    assert timeout.status == "timeout"
+    assert error.status == "error" and "KeyError" in error.stderr
+    assert "memory limit" in memory.describe_error()
+
+def test_dataframe_code_returns_final_answer():
+    df = pd.DataFrame({"gross": [2.5, 2.0, 1.5]})
+    result = asyncio.run(run_dataframe_code("final_answer = {'total': float(df['gross'].sum())}", df, LIMITS))
+    assert result.ok
+    assert result.value == {"total": 6.0}
+
+def test_final_answer_comes_back_as_capped_json():
+    df = pd.DataFrame({"gross": [2.5, 2.0, 1.5]})
+
+    async def run_both():
+        return await asyncio.gather(
+            run_dataframe_code("final_answer = {'max': df['gross'].max(), 'rows': df.to_dict('records')}", df, LIMITS),
+            run_dataframe_code("final_answer = 'x' * 20_000", df, LIMITS),
+        )
+
+    small, large = asyncio.run(run_both())
+    assert small.ok
+    assert small.value == {"max": 2.5, "rows": [{"gross": 2.5}, {"gross": 2.0}, {"gross": 1.5}]}
+    assert large.status == "output_limit" and large.value is None
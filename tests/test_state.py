@@ -0,0 +1,44 @@
+import multiprocessing
+import time
+
+from core.state import MemoryStateStore, SQLiteStateStore
+
+def _write_entries(path, worker, count):
+    store = SQLiteStateStore(path)
+    for i in range(count):
+        store.set("results", f"{worker}-{i}", {"worker": worker, "i": i})
+    store.close()
+
+def test_sqlite_store_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "state.db")
+    SQLiteStateStore(path).close()
+    workers = [multiprocessing.Process(target=_write_entries, args=(path, w, 50)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+
+    store = SQLiteStateStore(path)
+    assert store.get("results", "3-49") == {"worker": 3, "i": 49}
+    assert store.stats()["entries"] == 200
+
+def test_sqlite_store_expires_and_evicts_least_recently_used(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / "state.db"), max_bytes=100)
+    store.set("tasks", "short-lived", "x", ttl=0.01)
+    for i in range(5):
+        store.set("results", f"r{i}", "y" * 30)
+    time.sleep(0.02)
+    store.evict()
+
+    assert store.get("tasks", "short-lived") is None
+    assert [store.get("results", f"r{i}") is not None for i in range(5)] == [False, False, True, True, True]
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStateStore(max_bytes=70)
+    store.set("results", "a", "x" * 30)
+    store.set("results", "b", "x" * 30)
+    store.get("results", "a")
+    store.set("results", "c", "x" * 30)
+    assert store.get("results", "b") is None
+    assert store.get("results", "a") is not None
@@ -0,0 +1,43 @@
+import asyncio
+
+import tiktoken
+
+from utils import tokens
+
+class _WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+def _reset(monkeypatch, get_encoding):
+    monkeypatch.setattr(tokens, "_encoding", None)
+    monkeypatch.setattr(tokens, "_failed_at", None)
+    monkeypatch.setattr(tiktoken, "get_encoding", get_encoding)
+
+def test_failed_encoding_load_is_retried(monkeypatch):
+    def unavailable(name):
+        raise OSError("no network")
+
+    _reset(monkeypatch, unavailable)
+    assert tokens.load_encoding() is None
+    assert tokens.count_tokens("x" * 40) == 10
+
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: _WordEncoding())
+    assert tokens.load_encoding() is None  # Not retried before ENCODING_RETRY_SECONDS.
+    monkeypatch.setattr(tokens, "_failed_at", tokens._failed_at - tokens.ENCODING_RETRY_SECONDS)
+    assert tokens.load_encoding() is not None
+    assert tokens.count_tokens("x " * 40) == 40
+
+def test_event_loop_never_waits_for_the_encoding(monkeypatch):
+    _reset(monkeypatch, lambda name: _WordEncoding())
+
+    async def count():
+        first = tokens.count_tokens("hello world " * 10)
+        for _ in range(500):
+            if tokens._encoding is not None:
+                break
+            await asyncio.sleep(0.01)
+        return first, tokens.count_tokens("hello world " * 10)
+
+    estimated, counted = asyncio.run(count())
+    assert estimated == len("hello world " * 10) // 4
+    assert counted == 20
@@ -0,0 +1,202 @@
+"""
+A pool of warm headless-browser contexts for rendering JS-built pages.
+
+One Chromium instance is launched once and kept with BROWSER_POOL_SIZE
+browser contexts ready to use. Each render borrows a context, blocks
+images, fonts and media, waits for a table to appear, and stops at
+BROWSER_RENDER_TIMEOUT_SECONDS. The context then goes back to the pool.
+After BROWSER_CONTEXT_MAX_USES renders a context is replaced with a fresh one.
+Playwright is optional: without it (or without an installed browser)
+`render_page` returns None. A failed launch is retried after
+BROWSER_LAUNCH_RETRY_SECONDS, backing off exponentially, so a transient
+failure does not disable rendering until the process restarts.
+"""
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from core import deadline
+from core.config import (
+    BROWSER_POOL_SIZE, BROWSER_CONTEXT_MAX_USES, BROWSER_RENDER_TIMEOUT_SECONDS, BROWSER_LAUNCH_RETRY_SECONDS,
+)
+from utils.constants import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+try:
+    from playwright.async_api import async_playwright, Error as PlaywrightError
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+    PlaywrightError = RuntimeError
+
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+MAX_LAUNCH_RETRY_SECONDS = 600
+
+class _PooledContext:
+    def __init__(self, context):
+        self.context = context
+        self.uses = 0
+
+class BrowserContextPool:
+    """Keeps `size` browser contexts of one headless Chromium ready for rendering."""
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_uses: int = BROWSER_CONTEXT_MAX_USES,
+                 render_timeout: float = BROWSER_RENDER_TIMEOUT_SECONDS):
+        self.size = size
+        self.max_uses = max_uses
+        self.render_timeout = render_timeout
+        self.renders = 0
+        self.recycled = 0
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._contexts: List[_PooledContext] = []
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        """Launches the browser and pre-creates the contexts. Raises if Playwright or the browser is missing."""
+        if self.started:
+            return
+        if not PLAYWRIGHT_AVAILABLE:
+            raise RuntimeError("playwright is not installed.")
+        started = time.perf_counter()
+        self._playwright = await async_playwright().start()
+        try:
+            self._browser = await self._playwright.chromium.launch(headless=True)
+        except Exception:
+            await self._playwright.stop()
+            self._playwright = None
+            raise
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._new_context())
+        logger.info(f"Browser pool started with {self.size} contexts in {time.perf_counter() - started:.2f}s")
+
+    async def _new_context(self) -> _PooledContext:
+        context = await self._browser.new_context(user_agent=USER_AGENT, java_script_enabled=True)
+
+        async def block_heavy_resources(route):
+            if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route("**/*", block_heavy_resources)
+        pooled = _PooledContext(context)
+        self._contexts.append(pooled)
+        return pooled
+
+    async def _release(self, pooled: _PooledContext):
+        pooled.uses += 1
+        if pooled.uses >= self.max_uses:
+            self._contexts.remove(pooled)
+            try:
+                await pooled.context.close()
+            except PlaywrightError as e:
+                logger.debug(f"Closing a recycled browser context failed: {e}")
+            pooled = await self._new_context()
+            self.recycled += 1
+        self._idle.put_nowait(pooled)
+
+    async def render(self, url: str, wait_for_selector: str = "table") -> str:
+        """
+        Renders `url` and returns the resulting HTML. Waits for `wait_for_selector`
+        until the render deadline (BROWSER_RENDER_TIMEOUT_SECONDS, capped by the request
+        deadline) and returns whatever rendered if it never appears.
+        """
+        await self.start()
+        render_timeout = deadline.timeout_for(self.render_timeout, f"rendering {url}")
+        render_deadline = time.monotonic() + render_timeout
+        pooled = await asyncio.wait_for(self._idle.get(), timeout=render_timeout)
+        try:
+            page = await pooled.context.new_page()
+            try:
+                remaining_ms = max(1.0, render_deadline - time.monotonic()) * 1000
+                await page.goto(url, wait_until="domcontentloaded", timeout=remaining_ms)
+                try:
+                    remaining_ms = max(1.0, render_deadline - time.monotonic()) * 1000
+                    await page.wait_for_selector(wait_for_selector, timeout=remaining_ms)
+                except PlaywrightError:
+                    logger.info(f"No '{wait_for_selector}' rendered at {url} before the deadline.")
+                self.renders += 1
+                return await page.content()
+            finally:
+                await page.close()
+        finally:
+            await self._release(pooled)
+
+    async def close(self):
+        for pooled in self._contexts:
+            try:
+                await pooled.context.close()
+            except PlaywrightError:
+                pass
+        self._contexts.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+_shared_pool: Optional[BrowserContextPool] = None
+_start_lock: Optional[asyncio.Lock] = None
+_launch_failures = 0
+_retry_at = 0.0  # time.monotonic() before which no launch is attempted after a failure.
+
+async def get_browser_pool() -> Optional[BrowserContextPool]:
+    """
+    Returns the process-wide pool, starting it on first use. None if Playwright is missing,
+    or if the last launch failed and its retry backoff has not elapsed yet.
+    """
+    global _shared_pool, _start_lock, _launch_failures, _retry_at
+    if _shared_pool is not None:
+        return _shared_pool
+    if not PLAYWRIGHT_AVAILABLE or time.monotonic() < _retry_at:
+        return None
+    if _start_lock is None:
+        _start_lock = asyncio.Lock()
+    async with _start_lock:
+        if _shared_pool is None and time.monotonic() >= _retry_at:
+            pool = BrowserContextPool()
+            try:
+                await pool.start()
+            except Exception as e:
+                try:
+                    await pool.close()  # Whatever did start (e.g. the browser before a context failed).
+                except Exception:
+                    pass
+                _launch_failures += 1
+                delay = min(BROWSER_LAUNCH_RETRY_SECONDS * 2 ** (_launch_failures - 1), MAX_LAUNCH_RETRY_SECONDS)
+                _retry_at = time.monotonic() + delay
+                reason = str(e).splitlines()[0] if str(e) else type(e).__name__
+                logger.warning(f"Headless-browser fallback unavailable, retrying in {delay:.0f}s: {reason}")
+                return None
+            _shared_pool = pool
+            _launch_failures = 0
+    return _shared_pool
+
+async def render_page(url: str) -> Optional[str]:
+    """Renders `url` with the shared pool. Returns None if the browser is unavailable or the render fails."""
+    pool = await get_browser_pool()
+    if pool is None:
+        return None
+    try:
+        return await pool.render(url)
+    except deadline.DeadlineExceeded:
+        raise
+    except (asyncio.TimeoutError, PlaywrightError) as e:
+        deadline.raise_if_exceeded(f"rendering {url}", e)
+        logger.warning(f"Rendering {url} in the browser failed: {e}")
+        return None
+
+async def close_browser_pool():
+    """Shuts down the shared pool, if it was started."""
+    global _shared_pool
+    if _shared_pool is not None:
+        await _shared_pool.close()
+        _shared_pool = None
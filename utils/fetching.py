@@ -0,0 +1,176 @@
+"""
+Concurrent, polite fetching of HTML tables from one or more pages.
+
+`fetch_tables` fetches every start URL concurrently, follows `rel="next"`
+pagination links on the same host, and parses each page's tables (in a
+worker thread) as soon as that page arrives; pages without tables are
+rendered in a pooled headless browser (see `utils.browser_pool`). Requests to the same host are
+limited to SCRAPE_PER_HOST_CONCURRENCY at a time and their starts spaced by
+SCRAPE_POLITENESS_DELAY_SECONDS, process-wide.
+"""
+import asyncio
+import io
+import logging
+import re
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import httpx
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from core.config import (
+    SCRAPE_PER_HOST_CONCURRENCY, SCRAPE_POLITENESS_DELAY_SECONDS, SCRAPE_MAX_PAGES, BROWSER_FALLBACK_ENABLED,
+    SCRAPE_FETCH_TIMEOUT_SECONDS,
+)
+from core import deadline
+from core.metrics import observe_payload
+from core.timing import stage_timer
+from utils.constants import REQUEST_HEADERS, HTML_PARSER
+
+logger = logging.getLogger(__name__)
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+")
+NEXT_LINK_TEXTS = {"next", "next page", "next »", "next ›", "next >"}
+
+@dataclass
+class FetchedPage:
+    """One fetched page: its position in crawl order, its tables and the next page it links to."""
+    url: str
+    order: int
+    tables: List[pd.DataFrame] = field(default_factory=list)
+    next_url: Optional[str] = None
+
+def extract_urls(text: str) -> List[str]:
+    """Returns the distinct http(s) URLs in `text`, in order of appearance."""
+    urls = []
+    for match in URL_PATTERN.findall(text):
+        url = match.rstrip(".,;:!?")
+        # Keep balanced parentheses, e.g. https://en.wikipedia.org/wiki/Titanic_(1997_film)
+        while url.endswith(")") and url.count(")") > url.count("("):
+            url = url[:-1].rstrip(".,;:!?")
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+def find_next_page(html: str, page_url: str) -> Optional[str]:
+    """Returns the absolute URL of the page's "next" pagination link on the same host, if any."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    link = soup.find(["link", "a"], rel=lambda rel: rel and "next" in rel)
+    if link is None:
+        link = next(
+            (a for a in soup.find_all("a", href=True) if a.get_text(strip=True).lower() in NEXT_LINK_TEXTS),
+            None,
+        )
+    if link is None or not link.get("href"):
+        return None
+    next_url = urljoin(page_url, link["href"]).split("#")[0]
+    if urlparse(next_url).netloc != urlparse(page_url).netloc or next_url == page_url:
+        return None
+    return next_url
+
+def _parse_page(html: str, url: str, order: int) -> FetchedPage:
+    try:
+        tables = pd.read_html(io.StringIO(html))
+    except ValueError:  # pandas raises ValueError when a page has no tables.
+        tables = []
+    return FetchedPage(url=url, order=order, tables=tables, next_url=find_next_page(html, url))
+
+class _HostLimiter:
+    """Bounds concurrency and spaces request starts for one host."""
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self.next_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        now = time.monotonic()
+        wait = max(0.0, self.next_start - now)
+        self.next_start = max(now, self.next_start) + self.delay
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+# Host limiters are shared by all tasks on an event loop, so concurrent requests stay polite too.
+_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _HostLimiter]]" = weakref.WeakKeyDictionary()
+
+def _limiter_for(url: str) -> _HostLimiter:
+    per_loop = _limiters.setdefault(asyncio.get_running_loop(), {})
+    host = urlparse(url).netloc
+    if host not in per_loop:
+        per_loop[host] = _HostLimiter(SCRAPE_PER_HOST_CONCURRENCY, SCRAPE_POLITENESS_DELAY_SECONDS)
+    return per_loop[host]
+
+async def _fetch_page(client: httpx.AsyncClient, url: str, order: int, timeout: float) -> FetchedPage:
+    with stage_timer("scrape.fetch"):
+        async with _limiter_for(url):
+            # The fetch gets its own timeout, capped by what is left of the request deadline.
+            try:
+                response = await client.get(url, timeout=deadline.timeout_for(timeout, f"fetching {url}"))
+            except httpx.TimeoutException as e:
+                deadline.raise_if_exceeded(f"fetching {url}", e)
+                raise
+            response.raise_for_status()
+    observe_payload("html", len(response.content))
+    with stage_timer("scrape.parse"):
+        page = await asyncio.to_thread(_parse_page, response.text, url, order)
+
+    if not page.tables and BROWSER_FALLBACK_ENABLED:
+        # The tables may be built by JavaScript: render the page in a pooled headless browser.
+        from utils.browser_pool import render_page  # Imports playwright; only needed for the fallback.
+        with stage_timer("scrape.render"):
+            html = await render_page(url)
+        if html is not None:
+            with stage_timer("scrape.parse"):
+                page = await asyncio.to_thread(_parse_page, html, url, order)
+    logger.info(f"Fetched {url}: {len(page.tables)} tables" + (f", next page {page.next_url}" if page.next_url else ""))
+    return page
+
+async def fetch_tables(urls: List[str], max_pages: int = SCRAPE_MAX_PAGES,
+                       timeout: float = SCRAPE_FETCH_TIMEOUT_SECONDS) -> List[FetchedPage]:
+    """
+    Fetches all `urls` and the pages they paginate to (at most `max_pages` in total),
+    concurrently. Returns the pages in crawl order. Pages that fail are logged and
+    skipped; if every page fails, the first error is raised.
+    """
+    pages: List[FetchedPage] = []
+    errors: List[Exception] = []
+    seen = set()
+    pending = set()
+
+    async with httpx.AsyncClient(timeout=timeout, headers=REQUEST_HEADERS, follow_redirects=True) as client:
+        def schedule(url: str):
+            if url in seen or len(seen) >= max_pages:
+                return
+            seen.add(url)
+            pending.add(asyncio.create_task(_fetch_page(client, url, len(seen), timeout)))
+
+        for url in urls:
+            schedule(url)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.discard(task)
+                    try:
+                        page = task.result()
+                    except (httpx.HTTPError, ValueError) as e:
+                        logger.warning(f"Failed to fetch a page: {e}")
+                        errors.append(e)
+                        continue
+                    pages.append(page)
+                    if page.next_url:
+                        schedule(page.next_url)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    if not pages and errors:
+        raise errors[0]
+    return sorted(pages, key=lambda page: page.order)
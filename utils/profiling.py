@@ -0,0 +1,144 @@
+"""
+Opt-in CPU and memory profiling of generated analysis code.
+
+Profiles are stored under PROFILE_ARTIFACT_DIR/<task_id>/: a cProfile dump
+(`<label>.prof`), a readable top-functions listing (`<label>.txt`) and a
+`summary.json` with the CPU hot spots, tracemalloc peak and top allocations
+of every profiled run of that task. Generated code running in the sandbox
+is profiled inside the child process (see `utils.sandbox_runner`).
+`sweep_profiles` deletes a task's profiles PROFILE_MAX_AGE_SECONDS after its
+last profiled run.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import shutil
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional
+
+from core.config import PROFILE_ARTIFACT_DIR, PROFILE_SAMPLE_RATE, PROFILE_MAX_AGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 10
+SUMMARY_FILE = "summary.json"
+_TASK_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def should_profile(requested: bool = False) -> bool:
+    """True if the caller asked for a profile, or the request was picked by PROFILE_SAMPLE_RATE sampling."""
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+def profile_dir_for(task_id: str) -> str:
+    """Returns the artifact directory for a task's profiles."""
+    if not _TASK_ID_PATTERN.match(task_id):
+        raise ValueError(f"Invalid task id: {task_id!r}")
+    return os.path.join(PROFILE_ARTIFACT_DIR, task_id)
+
+def _top_functions(profiler: cProfile.Profile) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, lineno, funcname), (cc, nc, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{lineno}({funcname})",
+            "calls": nc,
+            "total_seconds": round(tottime, 6),
+            "cumulative_seconds": round(cumtime, 6),
+        })
+    rows.sort(key=lambda r: r["cumulative_seconds"], reverse=True)
+    return rows[:TOP_FUNCTIONS]
+
+def _top_allocations(snapshot: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    return [
+        {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    ]
+
+def _append_summary(output_dir: str, run: Dict[str, Any]):
+    path = os.path.join(output_dir, SUMMARY_FILE)
+    summary = {"runs": []}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            summary = json.load(f)
+    summary["runs"].append(run)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+@contextmanager
+def profiled(output_dir: str, label: str) -> Iterator[Dict[str, Any]]:
+    """
+    Runs the enclosed block under cProfile and tracemalloc and writes the
+    artifacts to `output_dir`. Yields a dict that is filled with the run summary
+    on exit; artifacts are written even if the block raises.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    run: Dict[str, Any] = {"label": label}
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        yield run
+    finally:
+        profiler.disable()
+        run["wall_seconds"] = round(time.perf_counter() - started, 6)
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+
+        profiler.dump_stats(os.path.join(output_dir, f"{label}.prof"))
+        listing = io.StringIO()
+        pstats.Stats(profiler, stream=listing).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(output_dir, f"{label}.txt"), "w", encoding="utf-8") as f:
+            f.write(listing.getvalue())
+
+        run["peak_memory_bytes"] = peak
+        run["top_functions"] = _top_functions(profiler)
+        run["top_allocations"] = _top_allocations(snapshot)
+        _append_summary(output_dir, run)
+        logger.info(f"Profile '{label}' written to {output_dir} (peak memory {peak / 1e6:.1f} MB)")
+
+def sweep_profiles(max_age_seconds: Optional[float] = None) -> int:
+    """
+    Deletes the profile directories of tasks whose newest file is older than `max_age_seconds`
+    (default PROFILE_MAX_AGE_SECONDS; 0 keeps everything). Returns the number of tasks deleted.
+    """
+    max_age_seconds = PROFILE_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+    if not max_age_seconds or not os.path.isdir(PROFILE_ARTIFACT_DIR):
+        return 0
+    now = time.time()
+    removed = 0
+    for task_id in os.listdir(PROFILE_ARTIFACT_DIR):
+        path = os.path.join(PROFILE_ARTIFACT_DIR, task_id)
+        try:
+            if not os.path.isdir(path) or not _TASK_ID_PATTERN.match(task_id):
+                continue
+            newest = max([os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)]
+                         + [os.path.getmtime(path)])
+        except OSError:
+            continue  # Removed concurrently by another worker.
+        if now - newest > max_age_seconds:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Profile sweep deleted the profiles of {removed} tasks from {PROFILE_ARTIFACT_DIR}.")
+    return removed
+
+def load_profile_summary(task_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the stored profile summary of a task, or None if the task was not profiled."""
+    path = os.path.join(profile_dir_for(task_id), SUMMARY_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,135 @@
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import pandas as pd
+
+from core.config import PROMPT_CONTEXT_TOKEN_BUDGET
+from utils.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Rendering limits, tried from most to least detailed until the context fits the budget.
+MAX_SAMPLE_ROWS = 5
+CELL_WIDTHS = (40, 24, 12)
+ELLIPSIS = "…"
+
+def dtype_code(dtype) -> str:
+    """Maps a pandas dtype to a short code: i=int, f=float, b=bool, dt=datetime, td=timedelta, c=category, s=text."""
+    if pd.api.types.is_bool_dtype(dtype):
+        return "b"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "i"
+    if pd.api.types.is_float_dtype(dtype):
+        return "f"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "dt"
+    if pd.api.types.is_timedelta64_dtype(dtype):
+        return "td"
+    if isinstance(dtype, pd.CategoricalDtype):
+        return "c"
+    return "s"
+
+def _truncate(value: Any, width: int) -> str:
+    text = " ".join(str(value).split())
+    if len(text) <= width:
+        return text
+    return text[:width - 1] + ELLIPSIS
+
+def _group_by_prefix(columns: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Groups consecutive column names sharing a leading `part_` prefix (as produced by
+    flattening multi-level headers) so the prefix is written once. Returns
+    (prefix, suffixes) pairs; ungrouped columns have an empty prefix and a single suffix.
+    """
+    groups: List[Tuple[List[str], List[str]]] = []  # (prefix segments, member names)
+    for col in columns:
+        segments = col.split("_")
+        if groups and len(segments) > 1:
+            prefix = groups[-1][0]
+            common = []
+            for a, b in zip(prefix, segments[:-1]):
+                if a != b:
+                    break
+                common.append(a)
+            if common:
+                groups[-1] = (common, groups[-1][1] + [col])
+                continue
+        groups.append((segments[:-1], [col]))
+
+    result = []
+    for prefix_segments, members in groups:
+        prefix = "_".join(prefix_segments) + "_"
+        if len(members) > 1:
+            result.append((prefix, [m[len(prefix):] for m in members]))
+        else:
+            result.append(("", members))
+    return result
+
+def render_schema(df: pd.DataFrame, max_columns: Optional[int] = None) -> str:
+    """Renders the shape and `name:dtype` column list, writing shared header prefixes once."""
+    columns = [str(c) for c in df.columns]
+    codes = {str(c): dtype_code(t) for c, t in df.dtypes.items()}
+    shown = columns if max_columns is None else columns[:max_columns]
+
+    parts = []
+    for prefix, suffixes in _group_by_prefix(shown):
+        if prefix:
+            inner = ",".join(f"{s}:{codes[prefix + s]}" for s in suffixes)
+            parts.append(f"{prefix}{{{inner}}}")
+        else:
+            parts.append(f"{suffixes[0]}:{codes[suffixes[0]]}")
+    if len(shown) < len(columns):
+        parts.append(f"... (+{len(columns) - len(shown)} more columns)")
+    return f"shape: {df.shape[0]} rows x {df.shape[1]} columns\n" + "; ".join(parts)
+
+def render_sample(df: pd.DataFrame, rows: int, cell_width: int, max_columns: Optional[int] = None) -> str:
+    """Renders the first `rows` rows as `|`-separated values in column order, truncating long cells."""
+    sample = df.iloc[:rows] if max_columns is None else df.iloc[:rows, :max_columns]
+    lines = []
+    for idx, row in zip(sample.index, sample.itertuples(index=False, name=None)):
+        lines.append(f"{idx}| " + " | ".join(_truncate(v, cell_width) for v in row))
+    return "\n".join(lines)
+
+def build_dataframe_context(df: pd.DataFrame, token_budget: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Builds a compact, token-budgeted description of `df` for LLM prompts.
+    Returns `df_columns` (schema), `df_head` (sample rows) and a `token_report`
+    comparing the compact form with the plain `df.head().to_string()` rendering.
+    """
+    budget = token_budget or PROMPT_CONTEXT_TOKEN_BUDGET
+    baseline_tokens = count_tokens(str(df.columns.tolist())) + count_tokens(df.head().to_string())
+
+    max_columns = None
+    schema = render_schema(df)
+    if count_tokens(schema) > budget:
+        # Even the schema alone is too big: keep as many leading columns as fit in half the budget.
+        max_columns = max(1, df.shape[1])
+        while max_columns > 1 and count_tokens(render_schema(df, max_columns)) > budget // 2:
+            max_columns = max(1, max_columns * 3 // 4)
+        schema = render_schema(df, max_columns)
+    schema_tokens = count_tokens(schema)
+
+    sample, rows, width = "", 0, CELL_WIDTHS[-1]
+    for rows in range(min(MAX_SAMPLE_ROWS, len(df)), 0, -1):
+        for width in CELL_WIDTHS:
+            sample = render_sample(df, rows, width, max_columns)
+            if schema_tokens + count_tokens(sample) <= budget:
+                break
+        else:
+            continue
+        break
+    else:
+        sample, rows = "", 0
+
+    compact_tokens = schema_tokens + count_tokens(sample)
+    report = {
+        "baseline_tokens": baseline_tokens,
+        "compact_tokens": compact_tokens,
+        "token_budget": budget,
+        "sample_rows": rows,
+        "cell_width": width,
+        "columns_shown": max_columns or df.shape[1],
+    }
+    logger.info(f"Prompt context: {baseline_tokens} -> {compact_tokens} tokens "
+                f"(budget {budget}, {rows} sample rows, cells <= {width} chars)")
+    return {"df_columns": schema, "df_head": sample, "token_report": report}
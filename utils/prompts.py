@@ -79,9 +79,11 @@ USER'S QUESTION:
 {task_description}
 
 DATAFRAME STRUCTURE:
-Columns: {df_columns}
+Columns are listed as `name:dtype` (i=int, f=float, b=bool, dt=datetime, td=timedelta, c=category, s=text).
+`prefix_{{a:i,b:f}}` stands for the two columns `prefix_a` and `prefix_b`.
+{df_columns}
 
-DATAFRAME HEAD:
+DATAFRAME SAMPLE ROWS (row index, then values in column order; long cells are truncated with "…"):
 {df_head}
 
 Now, write the complete Python script to answer the user's question. Remember to assign the result to a variable named `final_answer`.
@@ -0,0 +1,332 @@
+"""
+Resource-governed execution of generated code.
+
+Every execution runs in its own process (see `utils.sandbox_runner`) with an
+address-space limit (RLIMIT_AS), a CPU-time limit (RLIMIT_CPU), a wall-clock
+timeout, a cap on captured output and capped numpy/BLAS/DuckDB thread pools.
+When SANDBOX_CGROUP_ROOT points to a delegated cgroup v2 directory, each
+execution also gets its own cgroup for memory enforcement and accounting.
+Limit violations come back as a structured `SandboxResult` status so callers
+(e.g. the code-repair loop) can react to them. The wall-clock timeout is
+capped by the request deadline, and a cancelled caller kills the child's
+whole process group, so abandoned runs stop immediately.
+"""
+import asyncio
+import json
+import logging
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import uuid
+import weakref
+from dataclasses import dataclass, field, replace
+from typing import Dict, Any, List, Optional, Tuple
+
+from core import deadline
+from core.config import (
+    SANDBOX_MEMORY_LIMIT_MB, SANDBOX_CPU_LIMIT_SECONDS, SANDBOX_TIMEOUT_SECONDS,
+    SANDBOX_MAX_OUTPUT_BYTES, SANDBOX_THREADS, SANDBOX_CGROUP_ROOT, SANDBOX_MAX_CONCURRENCY,
+)
+from utils.sandbox_runner import RESULT_TOO_LARGE_EXIT_CODE
+
+logger = logging.getLogger(__name__)
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS", "NUMEXPR_MAX_THREADS", "POLARS_MAX_THREADS",
+)
+MEMORY_ERROR_MARKERS = ("MemoryError", "std::bad_alloc", "Out of Memory Error", "Cannot allocate memory")
+
+@dataclass
+class SandboxLimits:
+    """Per-execution resource limits. A value of 0 disables that limit."""
+    memory_mb: int = SANDBOX_MEMORY_LIMIT_MB
+    cpu_seconds: int = SANDBOX_CPU_LIMIT_SECONDS
+    timeout_seconds: float = SANDBOX_TIMEOUT_SECONDS
+    max_output_bytes: int = SANDBOX_MAX_OUTPUT_BYTES
+    threads: int = SANDBOX_THREADS
+
+@dataclass
+class SandboxResult:
+    """
+    Outcome of one governed execution. `status` is one of "ok", "error",
+    "timeout", "memory_limit", "cpu_limit" or "output_limit".
+    """
+    status: str
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    wall_seconds: float
+    limits: SandboxLimits
+    usage: Dict[str, Any] = field(default_factory=dict)
+    value: Any = None  # `final_answer` of DataFrame code, when it ran successfully.
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def describe_error(self) -> str:
+        """A message for logs and the code-repair prompt explaining why the execution failed."""
+        reasons = {
+            "timeout": f"Execution exceeded the {self.limits.timeout_seconds:.0f}s time limit and was killed. "
+                       "Make the script faster: filter and aggregate early, avoid Python loops over rows.",
+            "memory_limit": f"Execution exceeded the {self.limits.memory_mb} MB memory limit. "
+                            "Reduce memory use: avoid cross joins and large intermediate tables, "
+                            "select only the needed columns, aggregate in SQL before loading into pandas.",
+            "cpu_limit": f"Execution exceeded the {self.limits.cpu_seconds}s CPU-time limit and was killed. "
+                         "Use vectorised operations instead of row-wise apply or loops.",
+            "output_limit": f"The script printed (or returned as final_answer) more than "
+                            f"{self.limits.max_output_bytes} bytes and was stopped. Print or return only the "
+                            "final result; do not print or return whole data frames or debug output.",
+        }
+        message = reasons.get(self.status, f"Execution failed with exit code {self.returncode}.")
+        if self.status != "error":
+            message = f"Resource limit exceeded ({self.status}): {message}"
+        if self.stderr:
+            message += f"\n\nstderr:\n{self.stderr}"
+        return message
+
+class _Cgroup:
+    """A per-execution cgroup v2 child of SANDBOX_CGROUP_ROOT, used for memory enforcement and accounting."""
+    def __init__(self, root: str, memory_mb: int):
+        self.path = os.path.join(root, f"sandbox-{uuid.uuid4().hex[:12]}")
+        os.mkdir(self.path)
+        if memory_mb:
+            self._write("memory.max", str(memory_mb * 1024 * 1024))
+
+    def _write(self, name: str, value: str):
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(value)
+
+    def _read(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def add(self, pid: int):
+        self._write("cgroup.procs", str(pid))
+
+    def usage(self) -> Dict[str, Any]:
+        usage: Dict[str, Any] = {}
+        peak = self._read("memory.peak")
+        if peak:
+            usage["cgroup_memory_peak_bytes"] = int(peak)
+        events = self._read("memory.events") or ""
+        for line in events.splitlines():
+            key, _, value = line.partition(" ")
+            if key == "oom_kill":
+                usage["cgroup_oom_kills"] = int(value)
+        for line in (self._read("cpu.stat") or "").splitlines():
+            key, _, value = line.partition(" ")
+            if key == "usage_usec":
+                usage["cgroup_cpu_seconds"] = int(value) / 1e6
+        return usage
+
+    def remove(self):
+        try:
+            os.rmdir(self.path)
+        except OSError as e:
+            logger.debug(f"Could not remove sandbox cgroup {self.path}: {e}")
+
+def _child_env(threads: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    if threads:
+        for name in THREAD_ENV_VARS:
+            env[name] = str(threads)
+    return env
+
+def _kill(process: asyncio.subprocess.Process):
+    """Kills the sandboxed process and everything it spawned."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, ProcessLookupError, PermissionError):
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+async def _drain(stream: asyncio.StreamReader, cap: int, keep_tail: bool, on_overflow=None) -> Tuple[bytes, bool]:
+    """Reads a stream to EOF keeping at most `cap` bytes (the head, or the tail if `keep_tail`)."""
+    buffer = bytearray()
+    truncated = False
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return bytes(buffer), truncated
+        buffer += chunk
+        if cap and len(buffer) > cap:
+            if keep_tail:
+                del buffer[:len(buffer) - cap]
+            else:
+                del buffer[cap:]
+                if not truncated and on_overflow is not None:
+                    on_overflow()
+            truncated = True
+
+def _classify(returncode: Optional[int], stderr: str, timed_out: bool, output_truncated: bool,
+              usage: Dict[str, Any]) -> str:
+    if timed_out:
+        return "timeout"
+    if output_truncated:
+        return "output_limit"
+    if returncode == 0:
+        return "ok"
+    if usage.get("cgroup_oom_kills") or any(marker in stderr for marker in MEMORY_ERROR_MARKERS):
+        return "memory_limit"
+    # RLIMIT_CPU sends SIGXCPU at the soft limit and SIGKILL at the hard limit.
+    if returncode in (-getattr(signal, "SIGXCPU", 24), -getattr(signal, "SIGKILL", 9)):
+        return "cpu_limit"
+    return "error"
+
+_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _execution_slots() -> Optional[asyncio.Semaphore]:
+    if not SANDBOX_MAX_CONCURRENCY:
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(SANDBOX_MAX_CONCURRENCY)
+    return _slots[loop]
+
+async def _execute(runner_args: List[str], limits: SandboxLimits, workdir: str) -> SandboxResult:
+    """
+    Runs the sandbox child once one of the SANDBOX_MAX_CONCURRENCY execution slots is free.
+    Waiting for a slot counts against the request deadline, and the run gets whatever is left.
+    """
+    slots = _execution_slots()
+    if slots is None:
+        return await _run_process(runner_args, _within_deadline(limits), workdir)
+    await asyncio.wait_for(slots.acquire(), deadline.timeout_for(0, "running generated code") or None)
+    try:
+        return await _run_process(runner_args, _within_deadline(limits), workdir)
+    finally:
+        slots.release()
+
+async def _run_process(runner_args: List[str], limits: SandboxLimits, workdir: str) -> SandboxResult:
+    usage_file = os.path.join(workdir, "usage.json")
+    command = [
+        sys.executable, "-W", "ignore", "-m", "utils.sandbox_runner", *runner_args,
+        "--memory-mb", str(limits.memory_mb), "--cpu-seconds", str(limits.cpu_seconds),
+        "--threads", str(limits.threads), "--usage-file", usage_file,
+    ]
+
+    cgroup = None
+    if SANDBOX_CGROUP_ROOT:
+        try:
+            cgroup = _Cgroup(SANDBOX_CGROUP_ROOT, limits.memory_mb)
+        except OSError as e:
+            logger.debug(f"cgroup accounting unavailable under {SANDBOX_CGROUP_ROOT}: {e}")
+
+    usage: Dict[str, Any] = {}
+    try:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            env=_child_env(limits.threads), start_new_session=True,
+        )
+        if cgroup is not None:
+            try:
+                cgroup.add(process.pid)
+            except OSError as e:
+                logger.debug(f"Could not move sandbox process into {cgroup.path}: {e}")
+
+        timed_out = False
+        try:
+            readers = asyncio.gather(
+                _drain(process.stdout, limits.max_output_bytes, keep_tail=False, on_overflow=lambda: _kill(process)),
+                _drain(process.stderr, limits.max_output_bytes, keep_tail=True),
+                process.wait(),
+            )
+            try:
+                (stdout, stdout_truncated), (stderr, _), returncode = await asyncio.wait_for(
+                    readers, timeout=limits.timeout_seconds or None
+                )
+            except asyncio.TimeoutError:
+                timed_out = True
+                _kill(process)
+                await process.wait()
+                stdout, stdout_truncated, stderr, returncode = b"", False, b"", process.returncode
+        finally:
+            # Never leave a sandbox running behind a cancelled or failed caller.
+            if process.returncode is None:
+                _kill(process)
+                await process.wait()
+            wall_seconds = time.perf_counter() - started
+
+        usage["wall_seconds"] = round(wall_seconds, 4)
+        if os.path.exists(usage_file):
+            with open(usage_file, encoding="utf-8") as f:
+                usage.update(json.load(f))
+    finally:
+        # Runs on cancellation and errors too, so no per-execution cgroup is left behind.
+        if cgroup is not None:
+            usage.update(cgroup.usage())
+            cgroup.remove()
+
+    stderr_text = stderr.decode("utf-8", errors="replace")
+    status = _classify(returncode, stderr_text, timed_out, stdout_truncated, usage)
+    return SandboxResult(
+        status=status, returncode=returncode, stdout=stdout.decode("utf-8", errors="replace"),
+        stderr=stderr_text, wall_seconds=wall_seconds, limits=limits, usage=usage,
+    )
+
+def _within_deadline(limits: SandboxLimits) -> SandboxLimits:
+    """`limits` with the wall-clock limit capped by what is left of the request deadline."""
+    timeout = deadline.timeout_for(limits.timeout_seconds, "running generated code")
+    return limits if timeout == limits.timeout_seconds else replace(limits, timeout_seconds=timeout)
+
+async def run_script(code: str, limits: Optional[SandboxLimits] = None,
+                     profile_dir: Optional[str] = None, profile_label: str = "generated_code") -> SandboxResult:
+    """Runs a self-contained Python script under the sandbox limits and captures its output."""
+    limits = limits or SandboxLimits()
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    try:
+        script = os.path.join(workdir, "generated_code.py")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(code)
+        args = [script]
+        if profile_dir:
+            args += ["--profile-dir", profile_dir, "--profile-label", profile_label]
+        return await _execute(args, limits, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def run_dataframe_code(code: str, df, limits: Optional[SandboxLimits] = None,
+                             profile_dir: Optional[str] = None) -> SandboxResult:
+    """
+    Runs analysis code against `df` under the sandbox limits. The code sees the same
+    names as in-process execution (`df`, `pd`, `np`, `plt`, `sns`, `io`, `base64`) and
+    its `final_answer` is returned in `SandboxResult.value`.
+    """
+    limits = limits or SandboxLimits()
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    try:
+        script = os.path.join(workdir, "generated_code.py")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(code)
+        dataframe_path = os.path.join(workdir, "df.pkl")
+        result_path = os.path.join(workdir, "result.json")
+        await asyncio.to_thread(df.to_pickle, dataframe_path)
+
+        args = [script, "--dataframe", dataframe_path, "--result", result_path,
+                "--max-result-bytes", str(limits.max_output_bytes)]
+        if profile_dir:
+            args += ["--profile-dir", profile_dir]
+        result = await _execute(args, limits, workdir)
+        if result.status == "error" and result.returncode == RESULT_TOO_LARGE_EXIT_CODE:
+            result.status = "output_limit"
+        elif result.ok and os.path.exists(result_path):
+            # The generated code runs in the child too, so the cap is checked again here.
+            if limits.max_output_bytes and os.path.getsize(result_path) > limits.max_output_bytes:
+                result.status = "output_limit"
+            else:
+                with open(result_path, encoding="utf-8") as f:
+                    result.value = json.load(f)
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
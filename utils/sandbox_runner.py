@@ -0,0 +1,145 @@
+"""
+Child-process entry point for governed execution of generated code.
+
+Started by `utils.sandbox`; it applies the resource limits to itself, caps
+library thread pools, optionally profiles the run, and then either runs a
+self-contained script as `__main__` or executes DataFrame analysis code
+against a pickled `df`, writing `final_answer` back to the parent as JSON
+(at most --max-result-bytes of it).
+"""
+import argparse
+import atexit
+import importlib.abc
+import importlib.util
+import json
+import runpy
+import sys
+from contextlib import nullcontext
+
+# Exit status when `final_answer` serializes to more than --max-result-bytes.
+RESULT_TOO_LARGE_EXIT_CODE = 3
+
+def _apply_limits(memory_mb: int, cpu_seconds: int):
+    try:
+        import resource
+    except ImportError:  # Not available on Windows.
+        return
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if cpu_seconds:
+        # SIGXCPU at the soft limit, SIGKILL one second later.
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+
+def _record_usage(path: str):
+    """Writes this process's CPU time and peak RSS to `path` at exit."""
+    def write():
+        try:
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "user_cpu_seconds": round(usage.ru_utime, 4),
+                    "system_cpu_seconds": round(usage.ru_stime, 4),
+                    "max_rss_kb": usage.ru_maxrss,
+                }, f)
+        except Exception:
+            pass
+    atexit.register(write)
+
+class _DuckDBThreadCap(importlib.abc.MetaPathFinder):
+    """Caps DuckDB's worker threads on every `duckdb.connect()` without importing duckdb up front."""
+    def __init__(self, threads: int):
+        self.threads = threads
+
+    def find_spec(self, name, path, target=None):
+        if name != "duckdb":
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return spec
+        exec_module = spec.loader.exec_module
+        threads = self.threads
+
+        def exec_and_patch(module):
+            exec_module(module)
+            connect = module.connect
+
+            def capped_connect(database=":memory:", read_only=False, config=None, **kwargs):
+                config = dict(config or {})
+                config.setdefault("threads", threads)
+                return connect(database, read_only=read_only, config=config, **kwargs)
+
+            module.connect = capped_connect
+
+        spec.loader.exec_module = exec_and_patch
+        return spec
+
+def _run_dataframe_code(script: str, dataframe_path: str, result_path: str, max_result_bytes: int, profiling):
+    """Loads `df` and the libraries first, so `profiling` covers only the generated code itself."""
+    import base64
+    import io
+    import numpy as np
+    import pandas as pd
+
+    with open(script, encoding="utf-8") as f:
+        source = f.read()
+    df = pd.read_pickle(dataframe_path)
+    local_scope = {"df": df, "pd": pd, "np": np, "io": io, "base64": base64}
+    # Plotting libraries dominate start-up time; only import them for code that plots.
+    if "plt" in source or "sns" in source:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        local_scope.update({"plt": plt, "sns": sns})
+    code = compile(source, script, "exec")
+    with profiling:
+        exec(code, {"__builtins__": __builtins__}, local_scope)
+    if "final_answer" not in local_scope:
+        raise ValueError("The generated code did not produce a 'final_answer' variable.")
+
+    from utils.serialization import sanitize_for_json
+    payload = json.dumps(sanitize_for_json(local_scope["final_answer"]), default=str).encode("utf-8")
+    if max_result_bytes and len(payload) > max_result_bytes:
+        sys.stderr.write(f"final_answer is {len(payload)} bytes of JSON, over the {max_result_bytes} byte limit.\n")
+        sys.exit(RESULT_TOO_LARGE_EXIT_CODE)
+    with open(result_path, "wb") as f:
+        f.write(payload)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("script")
+    parser.add_argument("--memory-mb", type=int, default=0)
+    parser.add_argument("--cpu-seconds", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--usage-file")
+    parser.add_argument("--dataframe")
+    parser.add_argument("--result")
+    parser.add_argument("--max-result-bytes", type=int, default=0)
+    parser.add_argument("--profile-dir")
+    parser.add_argument("--profile-label", default="generated_code")
+    args = parser.parse_args(argv)
+
+    _apply_limits(args.memory_mb, args.cpu_seconds)
+    if args.usage_file:
+        _record_usage(args.usage_file)
+    if args.threads:
+        sys.meta_path.insert(0, _DuckDBThreadCap(args.threads))
+
+    if args.profile_dir:
+        from utils.profiling import profiled
+        profiling = profiled(args.profile_dir, args.profile_label)
+    else:
+        profiling = nullcontext()
+
+    if args.dataframe:
+        _run_dataframe_code(args.script, args.dataframe, args.result, args.max_result_bytes, profiling)
+    else:
+        sys.argv = [args.script]
+        with profiling:
+            runpy.run_path(args.script, run_name="__main__")
+
+if __name__ == "__main__":
+    main()
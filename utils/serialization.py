@@ -0,0 +1,21 @@
+import math
+
+import numpy as np
+
+def sanitize_for_json(obj):
+    if isinstance(obj, (dict, list, str, int, float, bool, type(None))):
+        if isinstance(obj, dict):
+            return {str(k): sanitize_for_json(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [sanitize_for_json(v) for v in obj]
+        elif isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
+            return None
+        elif isinstance(obj, (np.integer, np.int64)):
+            return int(obj)
+        elif isinstance(obj, (np.floating, np.float64)):
+            return float(obj)
+        elif isinstance(obj, (np.ndarray,)):
+            return sanitize_for_json(obj.tolist())
+        return obj
+    # If not a standard JSON type, convert to string
+    return str(obj)
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# tiktoken has no Gemini tokenizer; cl100k_base is a close enough proxy for budgeting.
+TOKEN_ENCODING = "cl100k_base"
+# A failed load (e.g. no network to download the BPE file) is retried after this long.
+ENCODING_RETRY_SECONDS = 300
+
+_encoding = None
+_failed_at: Optional[float] = None
+_loading = threading.Lock()
+
+def _may_load() -> bool:
+    return _failed_at is None or time.monotonic() - _failed_at >= ENCODING_RETRY_SECONDS
+
+def load_encoding():
+    """
+    Loads the tiktoken encoding, downloading its BPE file on first use, so this blocks:
+    call it from a worker thread or at start-up. Returns None if tiktoken or its data
+    files are unavailable; failures are not cached, the load is retried later.
+    """
+    global _encoding, _failed_at
+    with _loading:
+        if _encoding is None and _may_load():
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                _failed_at = None
+            except Exception as e:
+                _failed_at = time.monotonic()
+                logger.warning(f"tiktoken encoding '{TOKEN_ENCODING}' unavailable, estimating tokens from length: {e}")
+    return _encoding
+
+def _get_encoding():
+    """
+    The encoding if it is loaded. Outside an event loop it is loaded on demand; on the
+    event loop it is loaded in a background thread instead and None is returned meanwhile.
+    """
+    if _encoding is not None:
+        return _encoding
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return load_encoding()
+    if _may_load() and not _loading.locked():
+        threading.Thread(target=load_encoding, name="tiktoken-load", daemon=True).start()
+    return None
+
+def count_tokens(text: str) -> int:
+    """Counts the tokens in `text` with tiktoken, falling back to a ~4 characters per token estimate."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
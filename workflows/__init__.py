@@ -1,11 +1,25 @@
 # LangChain workflows package
 """
 This package contains LangChain workflows for data analysis tasks.
+
+Workflow classes are resolved lazily (PEP 562) so that importing the package
+does not pull in pandas, matplotlib or langchain until a workflow is needed.
 """
 
+import importlib
+
 from core.base import BaseWorkflow, WorkflowOrchestrator, AdvancedWorkflowOrchestrator
-from .web_scraping import MultiStepWebScrapingWorkflow
-from .database_analysis import DatabaseAnalysisWorkflow
+
+_LAZY_WORKFLOWS = {
+    "MultiStepWebScrapingWorkflow": ".web_scraping",
+    "DatabaseAnalysisWorkflow": ".database_analysis",
+}
+
+def __getattr__(name):
+    if name in _LAZY_WORKFLOWS:
+        module = importlib.import_module(_LAZY_WORKFLOWS[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     "BaseWorkflow",
@@ -13,4 +27,4 @@ __all__ = [
     "AdvancedWorkflowOrchestrator",
     "MultiStepWebScrapingWorkflow",
     "DatabaseAnalysisWorkflow",
-]
\ No newline at end of file
+]
@@ -1,16 +1,21 @@
 import logging
 import json
 import re
-import subprocess
+import time
 import pandas as pd
 import numpy as np
 from typing import Dict, Any, Optional
 
+from core import deadline
 from core.base import BaseWorkflow
+from core.metrics import observe_payload, observe_sandbox, record_retry
+from core.timing import stage_timer
 from utils.prompts import (
     DATABASE_CODE_GENERATION_SYSTEM_PROMPT,
     DATABASE_CODE_FIXING_PROMPT,
 )
+from utils.prompt_context import build_dataframe_context
+from utils.sandbox import run_script
 
 logger = logging.getLogger(__name__)
 
@@ -53,15 +58,22 @@ class DatabaseAnalysisWorkflow(BaseWorkflow):
 
         logger.info(f"Starting database analysis workflow. Local file provided: {file_path is not None}")
 
-        data_summary = self._create_data_summary(task_description, file_path)
+        with stage_timer("summary"):
+            data_summary = self._create_data_summary(task_description, file_path)
 
+        started = time.perf_counter()
         generated_code = await self._generate_python_code(task_description, data_summary)
+        generation_seconds = time.perf_counter() - started
 
-        execution_result = await self._execute_and_fix_code(generated_code, task_description, data_summary)
+        execution_result = await self._execute_and_fix_code(
+            generated_code, task_description, data_summary, profile_dir=input_data.get("profile_dir"),
+            generation_seconds=generation_seconds,
+        )
 
         try:
-            json_output_str = extract_json_from_output(execution_result)
-            final_result = json.loads(json_output_str)
+            with stage_timer("json.extract"):
+                json_output_str = extract_json_from_output(execution_result)
+                final_result = json.loads(json_output_str)
             return make_json_serializable(final_result)
         except (json.JSONDecodeError, TypeError) as e:
             logger.error(f"Final output was not valid JSON. Error: {e}\nOutput:\n{execution_result}")
@@ -75,19 +87,7 @@ class DatabaseAnalysisWorkflow(BaseWorkflow):
         if file_path:
             # --- Case 1: A local file was uploaded ---
             logger.info(f"Creating data summary from local file: {file_path}")
-            try:
-                if file_path.lower().endswith('.csv'):
-                    df_head = pd.read_csv(file_path, nrows=5)
-                elif file_path.lower().endswith(('.xls', '.xlsx')):
-                    df_head = pd.read_excel(file_path, nrows=5)
-                else:
-                    raise ValueError(f"Unsupported file type: {file_path}")
-                
-                schema = df_head.dtypes.to_string()
-                # The placeholder '__FILE_PATH__' will be used in the prompt
-                return f"Data Source: Local file\nFile Path Placeholder: '__FILE_PATH__'\n\nSchema:\n{schema}\n\nFirst 5 rows:\n{df_head.to_string()}"
-            except Exception as e:
-                raise ValueError(f"Could not read the provided data file at {file_path}. Error: {e}")
+            return self._summarize_file_sample(self._read_file_sample(file_path))
         else:
             # --- Case 2: No local file, extract info from the prompt ---
             logger.info("Creating data summary from the task description text.")
@@ -101,6 +101,28 @@ class DatabaseAnalysisWorkflow(BaseWorkflow):
             else:
                 raise ValueError("The request does not contain a local data file or a valid data source description (S3 path and schema) in the text.")
 
+    def _read_file_sample(self, file_path: str) -> pd.DataFrame:
+        try:
+            if file_path.lower().endswith('.csv'):
+                return pd.read_csv(file_path, nrows=5)
+            elif file_path.lower().endswith(('.xls', '.xlsx')):
+                return pd.read_excel(file_path, nrows=5)
+            else:
+                raise ValueError(f"Unsupported file type: {file_path}")
+        except Exception as e:
+            raise ValueError(f"Could not read the provided data file at {file_path}. Error: {e}")
+
+    def _summarize_file_sample(self, df_head: pd.DataFrame) -> str:
+        context = build_dataframe_context(df_head)
+        # The placeholder '__FILE_PATH__' will be used in the prompt
+        return (
+            "Data Source: Local file\nFile Path Placeholder: '__FILE_PATH__'\n\n"
+            "Schema (name:dtype; i=int, f=float, b=bool, dt=datetime, s=text; "
+            "`prefix_{a,b}` stands for columns prefix_a and prefix_b; shape is of the sample read):\n"
+            f"{context['df_columns']}\n\n"
+            f"First rows (values in column order, long cells truncated):\n{context['df_head']}"
+        )
+
     async def _generate_python_code(self, task: str, summary: str, code_to_fix: str = "", error: str = "") -> str:
         """Generates or fixes Python code using the LLM."""
         if code_to_fix:
@@ -114,7 +136,8 @@ class DatabaseAnalysisWorkflow(BaseWorkflow):
             prompt_input = {"data_summary": summary, "user_questions": task}
         
         full_prompt = prompt_template.format(**prompt_input)
-        response_obj = await self.llm.ainvoke(full_prompt)
+        with stage_timer("codegen.llm"):
+            response_obj = await self.llm.ainvoke(full_prompt)
         response_str = response_obj.content if hasattr(response_obj, 'content') else str(response_obj)
         
         match = re.search(r'```python\n(.*?)```', response_str, re.DOTALL)
@@ -123,30 +146,47 @@ class DatabaseAnalysisWorkflow(BaseWorkflow):
         logger.warning("LLM response did not contain a valid python code block, returning raw response.")
         return response_str.strip()
 
-    async def _execute_and_fix_code(self, code: str, task: str, summary:str, max_retries: int = 1) -> str:
-        """Executes the Python script and attempts to fix it if it fails."""
+    async def _execute_and_fix_code(self, code: str, task: str, summary:str, max_retries: int = 1,
+                                    profile_dir: Optional[str] = None, generation_seconds: float = 0.0) -> str:
+        """
+        Executes the Python script and attempts to fix it if it fails.
+        If `profile_dir` is given, every attempt is run under the profiler and its artifacts saved there.
+        A repair is skipped when it cannot finish before the request deadline; it is expected to take
+        as long as the last code generation (`generation_seconds`) plus the failed run.
+        """
         current_code = code
         for attempt in range(max_retries + 1):
             logger.info(f"Executing generated code (Attempt {attempt + 1}/{max_retries + 1})")
             
             # The generated code should now be self-contained and not need file path replacement
-            with open("temp_database_generated_code.py", "w", encoding="utf-8") as f:
-                f.write(current_code)
-            
-            try:
-                result = subprocess.run(
-                    ["python", "-W", "ignore", "temp_database_generated_code.py"], # Added -W ignore to suppress warnings
-                    capture_output=True, text=True, timeout=300, check=True
-                )
-                logger.info("Code executed successfully.")
+            observe_payload("generated_code", len(current_code))
+            with stage_timer("codegen.exec"):
+                result = await run_script(current_code, profile_dir=profile_dir, profile_label=f"attempt{attempt + 1}")
+            observe_sandbox("subprocess", result.wall_seconds, result.status)
+
+            if result.ok:
+                observe_payload("stdout", len(result.stdout))
+                logger.info(f"Code executed successfully. Usage: {result.usage}")
                 return result.stdout
-            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-                error_output = e.stderr if hasattr(e, 'stderr') else "Execution timed out."
-                logger.warning(f"Code execution failed on attempt {attempt + 1}. Error:\n{error_output}")
-                
-                if attempt < max_retries:
-                    logger.info("Attempting to fix the code...")
-                    current_code = await self._generate_python_code(task, summary, code_to_fix=current_code, error=error_output)
-                else:
-                    raise ValueError(f"Code failed after {max_retries + 1} attempts. Last error: {error_output}")
+
+            # A run cut short by the request deadline is a timeout of the request, not a code error.
+            deadline.raise_if_exceeded("running generated code")
+            # Resource-limit failures are described to the repair prompt so the fix can target them.
+            error_output = result.describe_error()
+            logger.warning(f"Code execution failed on attempt {attempt + 1} ({result.status}). Error:\n{error_output}")
+            
+            if attempt < max_retries:
+                estimated_seconds = generation_seconds + result.wall_seconds
+                if not deadline.can_finish(estimated_seconds):
+                    raise deadline.DeadlineExceeded(
+                        f"Code failed on attempt {attempt + 1} and the request deadline leaves no time for a repair "
+                        f"attempt (~{estimated_seconds:.0f}s needed). Last error: {error_output}"
+                    )
+                logger.info("Attempting to fix the code...")
+                record_retry("database_analysis", "code_fix")
+                started = time.perf_counter()
+                current_code = await self._generate_python_code(task, summary, code_to_fix=current_code, error=error_output)
+                generation_seconds = time.perf_counter() - started
+            else:
+                raise ValueError(f"Code failed after {max_retries + 1} attempts. Last error: {error_output}")
         raise RuntimeError("Exited execution loop unexpectedly.")
\ No newline at end of file
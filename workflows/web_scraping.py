@@ -3,19 +3,24 @@ import logging
 import re
 import json
 import base64
+import hashlib
 import io
-import math
+import time
 import traceback
-from typing import Dict, Any, List, Optional, Set
+from typing import Dict, Any, List, Optional, Set, Tuple
 import asyncio
-import httpx
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
 
+from core import deadline
 from core.base import BaseWorkflow
+from core.frame_cache import frame_cache_key, get_frame_cache, load_once
+from core.metrics import observe_payload, observe_sandbox
+from core.state import TABLE_SELECTION, get_state_store
+from core.timing import stage_timer
 # Assume these prompt files and constants are updated appropriately
 from utils.prompts import (
     TABLE_SELECTION_SYSTEM_PROMPT,
@@ -24,13 +29,18 @@ from utils.prompts import (
     CODE_GENERATION_HUMAN_PROMPT,   # New prompt for code generation
 )
 from utils.constants import (
-    REQUEST_HEADERS, HTML_PARSER, ENGLISH_STOPWORDS, WORD_REGEX_PATTERN,
+    ENGLISH_STOPWORDS, WORD_REGEX_PATTERN,
     MIN_KEYWORD_LENGTH, MATPLOTLIB_BACKEND
 )
 
+from utils.prompt_context import build_dataframe_context
+from utils.profiling import profiled
+from utils.sandbox import run_dataframe_code
+from utils.serialization import sanitize_for_json
+from utils.fetching import extract_urls, fetch_tables
+
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema import StrOutputParser
-from core.config import get_chat_model
+from core.config import get_shared_chat_model, SANDBOX_MODE, TABLE_SELECTION_CACHE_TTL_SECONDS, FRAME_CACHE_ENABLED
 
 matplotlib.use(MATPLOTLIB_BACKEND)
 logger = logging.getLogger(__name__)
@@ -41,7 +51,10 @@ CUSTOM_STOPWORDS = {
     'respond', 'json', 'array', 'strings', 'containing', 'what', 'how', 'which'
 }
 STOPWORDS = ENGLISH_STOPWORDS | CUSTOM_STOPWORDS
-_table_selection_cache: Dict[str, int] = {}
+# Bump whenever CleanStep's output changes, so cached cleaned frames are not reused.
+CLEANING_VERSION = "1"
+# Minimum column overlap (Jaccard) for a table on another page to be appended to the selected one.
+TABLE_MATCH_THRESHOLD = 0.8
 
 def _strip_code_fences(text: str) -> str:
     if not isinstance(text, str): return text
@@ -56,52 +69,102 @@ def extract_keywords(task_description: str, stopwords: Optional[Set[str]] = None
     words = re.findall(WORD_REGEX_PATTERN, task_description.lower())
     return [w for w in words if w not in stopwords and len(w) >= MIN_KEYWORD_LENGTH]
 
-def sanitize_for_json(obj):
-    if isinstance(obj, (dict, list, str, int, float, bool, type(None))):
-        if isinstance(obj, dict):
-            return {str(k): sanitize_for_json(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [sanitize_for_json(v) for v in obj]
-        elif isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-            return None
-        elif isinstance(obj, (np.integer, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
-            return float(obj)
-        elif isinstance(obj, (np.ndarray,)):
-            return sanitize_for_json(obj.tolist())
-        return obj
-    # If not a standard JSON type, convert to string
-    return str(obj)
+def _normalize_column(name) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"\[.*?\]", "", str(name))).strip().lower()
+
+def combine_matching_tables(tables: List[pd.DataFrame], sources: List[str], selected: int) -> pd.DataFrame:
+    """
+    Returns `tables[selected]` with the best-matching table of every other source page
+    appended (columns aligned by name) and a `source` column naming each row's page.
+    A table matches if its columns overlap the selected table's by TABLE_MATCH_THRESHOLD.
+    If no other page has a matching table, the selected table is returned unchanged.
+    """
+    base = tables[selected]
+    base_columns = {_normalize_column(col): col for col in base.columns}
+    parts = [(sources[selected], base)]
+    for source in dict.fromkeys(sources):
+        if source == sources[selected]:
+            continue
+        best, best_score = None, 0.0
+        for table, table_source in zip(tables, sources):
+            if table_source != source:
+                continue
+            columns = {_normalize_column(col) for col in table.columns}
+            score = len(columns & base_columns.keys()) / len(columns | base_columns.keys())
+            if score > best_score:
+                best, best_score = table, score
+        if best is not None and best_score >= TABLE_MATCH_THRESHOLD:
+            renamed = best.rename(columns=lambda col: base_columns.get(_normalize_column(col), col))
+            parts.append((source, renamed))
+
+    if len(parts) == 1:
+        return base
+    source_column = "source" if "source" not in base.columns else "source_url"
+    logger.info(f"Combining matching tables from {len(parts)} pages.")
+    return pd.concat(
+        [table.assign(**{source_column: source}) for source, table in parts], ignore_index=True, sort=False,
+    )
+
+def _table_selection_key(sources: List[str], tables: List[pd.DataFrame], keywords: List[str]) -> str:
+    signature = [[source, [str(col) for col in table.columns]] for source, table in zip(sources, tables)]
+    payload = json.dumps({"tables": signature, "keywords": sorted(set(keywords))})
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def _cached_table_selection(key: str) -> Optional[int]:
+    try:
+        return await get_state_store().aget(TABLE_SELECTION, key)
+    except Exception as e:
+        logger.warning(f"Table-selection cache lookup failed: {e}")
+        return None
+
+async def _store_table_selection(key: str, index: int):
+    try:
+        await get_state_store().aset(TABLE_SELECTION, key, int(index), ttl=TABLE_SELECTION_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Could not cache the table selection: {e}")
 
 # --- Workflow Steps ---
 
 class ScrapeStep:
-    """Finds and scrapes the most relevant table from a URL."""
+    """
+    Finds and scrapes the most relevant table from one or more URLs (following
+    pagination). Matching tables from the other pages are appended to it.
+    """
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        url = input_data["url"]
+        urls = input_data.get("urls") or [input_data["url"]]
         task_description = input_data.get("task_description", "")
-        logger.info(f"Scraping data from {url} for task: '{task_description[:50]}...'")
-        
-        async with httpx.AsyncClient(timeout=20, headers=REQUEST_HEADERS, follow_redirects=True) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            
-        tables = pd.read_html(io.StringIO(response.text))
-        if not tables: raise ValueError(f"No HTML tables found at {url}.")
-        
-        keywords = extract_keywords(task_description)
-        # LLM-based selection is good, so we keep it.
-        # This part of the original logic was solid.
-        best_table_idx = await self._select_best_table_with_llm(tables, task_description, keywords)
+        logger.info(f"Scraping data from {', '.join(urls)} for task: '{task_description[:50]}...'")
+        tables, sources = await self.fetch(urls)
+        return {**input_data, "data": await self.select(tables, sources, task_description)}
+
+    async def fetch(self, urls: List[str]) -> Tuple[List[pd.DataFrame], List[str]]:
+        """Fetches every table of the pages (and the URL it came from). Independent of the question."""
+        pages = await fetch_tables(urls)
+        tables = [table for page in pages for table in page.tables]
+        sources = [page.url for page in pages for _ in page.tables]
+        if not tables: raise ValueError(f"No HTML tables found at {', '.join(urls)}.")
+        for table in tables:
+            # Clean up multi-level column headers
+            if isinstance(table.columns, pd.MultiIndex):
+                table.columns = ['_'.join(map(str, col)).strip() for col in table.columns.values]
+        return tables, sources
+
+    async def select(self, tables: List[pd.DataFrame], sources: List[str], task_description: str) -> pd.DataFrame:
+        """Picks the table that answers `task_description` and appends matching tables from the other pages."""
+        with stage_timer("scrape.select"):
+            keywords = extract_keywords(task_description)
+            # Selections are shared across worker processes, keyed by the pages, their tables and the keywords.
+            cache_key = _table_selection_key(sources, tables, keywords)
+            best_table_idx = await _cached_table_selection(cache_key)
+            if best_table_idx is None or best_table_idx >= len(tables):
+                # LLM-based selection is good, so we keep it.
+                # This part of the original logic was solid.
+                best_table_idx = await self._select_best_table_with_llm(tables, task_description, keywords)
+                await _store_table_selection(cache_key, best_table_idx)
         
-        data = tables[best_table_idx]
-        # Clean up multi-level column headers
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = ['_'.join(map(str, col)).strip() for col in data.columns.values]
-            
+        data = combine_matching_tables(tables, sources, best_table_idx)
         logger.info(f"Selected table with shape {data.shape} and columns: {data.columns.tolist()}")
-        return {"data": data, **input_data}
+        return data
 
     async def _select_best_table_with_llm(self, tables: List[pd.DataFrame], task_description: str, keywords: List[str]) -> int:
         # This function can remain largely the same as the original script.
@@ -142,7 +205,7 @@ class CleanStep:
         data.columns = [col.replace(' ', '_').replace('(', '').replace(')', '') for col in data.columns]
         
         logger.info(f"Cleaned data. Final columns: {data.columns.tolist()}")
-        return {"data": data.reset_index(drop=True), **input_data}
+        return {**input_data, "data": data.reset_index(drop=True)}
 
 
 class CodeGeneratingAnswerStep:
@@ -162,18 +225,22 @@ class CodeGeneratingAnswerStep:
             ("human", CODE_GENERATION_HUMAN_PROMPT)    # A new human prompt is needed
         ])
         
-        llm = get_chat_model() # Low temperature for reliable code
-        chain = prompt | llm | StrOutputParser()
+        llm = get_shared_chat_model()
 
-        # Provide the LLM with the DataFrame's structure and the user's question
+        # Provide the LLM with a compact, token-budgeted view of the DataFrame and the user's question
+        context = input_data.get("df_context") or build_dataframe_context(df)
         code_generation_request = {
             "task_description": task_description,
-            "df_head": df.head().to_string(),
-            "df_columns": str(df.columns.tolist())
+            "df_head": context["df_head"],
+            "df_columns": context["df_columns"],
         }
         
-        generated_code_str = await asyncio.to_thread(chain.invoke, code_generation_request)
+        # Native async call on the shared client: no thread-pool slot is held while waiting on the LLM.
+        with stage_timer("codegen.llm"):
+            response = await llm.ainvoke(prompt.format_messages(**code_generation_request))
+        generated_code_str = response.content if hasattr(response, 'content') else str(response)
         generated_code = _strip_code_fences(generated_code_str)
+        observe_payload("generated_code", len(generated_code))
 
         logger.info(f"--- Generated Code ---\n{generated_code}\n----------------------")
         
@@ -181,12 +248,26 @@ class CodeGeneratingAnswerStep:
         # The generated code should set a variable named 'final_answer'.
         # This variable can be a dictionary, list, string, number, or a plot.
         
-        # Provide a local scope for the execution, including the DataFrame `df`
-        local_scope = {"df": df, "pd": pd, "np": np, "plt": plt, "sns": sns, "io": io, "base64": base64}
+        profile_dir = input_data.get("profile_dir")
+        if SANDBOX_MODE == "governed":
+            return await self._execute_governed(generated_code, df, profile_dir)
+
+        # In-process code cannot be interrupted once it runs, so do not start it past the deadline.
+        deadline.check("running generated code")
+        # Provide a local scope for the execution, including the DataFrame `df`.
+        # It gets a copy: the frame may be shared with follow-up questions through the frame cache.
+        local_scope = {"df": df.copy(), "pd": pd, "np": np, "plt": plt, "sns": sns, "io": io, "base64": base64}
         
+        started = time.perf_counter()
         try:
             # Execute the code in the defined local scope
-            exec(generated_code, {"__builtins__": __builtins__}, local_scope)
+            with stage_timer("codegen.exec"):
+                if profile_dir:
+                    with profiled(profile_dir, "generated_code"):
+                        exec(generated_code, {"__builtins__": __builtins__}, local_scope)
+                else:
+                    exec(generated_code, {"__builtins__": __builtins__}, local_scope)
+            observe_sandbox("inprocess", time.perf_counter() - started, "ok")
             
             # The generated code is expected to produce a 'final_answer' variable
             if 'final_answer' in local_scope:
@@ -196,11 +277,29 @@ class CodeGeneratingAnswerStep:
                 raise ValueError("The generated code did not produce a 'final_answer' variable.")
 
         except Exception as e:
+            observe_sandbox("inprocess", time.perf_counter() - started, "error")
             logger.error(f"Error executing generated code: {e}")
             # Provide a detailed traceback for debugging
             error_trace = traceback.format_exc()
             return {"error": "Failed to execute the generated analysis code.", "details": str(e), "traceback": error_trace}
 
+    async def _execute_governed(self, generated_code: str, df: pd.DataFrame, profile_dir: Optional[str]) -> Any:
+        """Runs the generated code in the resource-limited sandbox process."""
+        with stage_timer("codegen.exec"):
+            result = await run_dataframe_code(generated_code, df, profile_dir=profile_dir)
+        observe_sandbox("governed", result.wall_seconds, result.status)
+
+        if result.ok:
+            return result.value
+        deadline.raise_if_exceeded("running generated code")
+        logger.error(f"Error executing generated code ({result.status}): {result.describe_error()}")
+        return {
+            "error": "Failed to execute the generated analysis code.",
+            "details": result.describe_error(),
+            "traceback": result.stderr,
+            "status": result.status,
+        }
+
 
 class MultiStepWebScrapingWorkflow(BaseWorkflow):
     """
@@ -209,16 +308,42 @@ class MultiStepWebScrapingWorkflow(BaseWorkflow):
     """
     async def execute(self, input_data):
         task_description = input_data.get("task_description", "")
-        url_match = re.search(r"https?://[^\s]+", task_description)
-        if not url_match:
+        urls = extract_urls(task_description)
+        if not urls:
             raise ValueError("No URL found in the task description.")
-        url = url_match.group(0)
+        step_input = {
+            "url": urls[0], "urls": urls, "task_description": task_description,
+            "profile_dir": input_data.get("profile_dir"),
+        }
+
+        # Follow-up questions on the same pages that select by the same keywords start straight
+        # at code generation. Concurrent tasks on the same pages (e.g. in a batch) share a single
+        # fetch, but each selects its own table: the cleaned frame depends on the question.
+        cache = get_frame_cache() if FRAME_CACHE_ENABLED else None
+        cache_key = frame_cache_key(urls, CLEANING_VERSION, extract_keywords(task_description))
+
+        async def load_cleaned_data():
+            cached = await asyncio.to_thread(cache.get, cache_key) if cache else None
+            if cached is not None:
+                logger.info(f"Reusing cleaned data for {', '.join(urls)} (schema {cached.fingerprint}).")
+                return cached.df, cached.summary
+
+            # Step 1: Scrape the web pages (concurrently) and select the right table
+            scrape = ScrapeStep()
+            logger.info(f"Scraping data from {', '.join(urls)} for task: '{task_description[:50]}...'")
+            tables, sources = await load_once(frame_cache_key(urls, "pages"), lambda: scrape.fetch(urls))
+            scraped_data = {**step_input, "data": await scrape.select(tables, sources, task_description)}
 
-        # Step 1: Scrape the web page to find the right table
-        scraped_data = await ScrapeStep().run({"url": url, "task_description": task_description})
+            # Step 2: Apply robust cleaning and preparation
+            with stage_timer("clean"):
+                df = CleanStep().run(scraped_data)["data"]
+            context = build_dataframe_context(df)
+            if cache:
+                await asyncio.to_thread(cache.put, cache_key, df, context)
+            return df, context
 
-        # Step 2: Apply robust cleaning and preparation
-        cleaned_data = CleanStep().run(scraped_data)
+        df, context = await load_once(cache_key, load_cleaned_data)
+        cleaned_data = {**step_input, "data": df, "df_context": context}
 
         # Step 3: Generate and execute code to get the final answer
         final_answer = await CodeGeneratingAnswerStep().run(cleaned_data)